@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import json
+import random
+import struct
+import time
+from omron_2jcie_bu01 import DataParser
+from omron_2jcie_bu01.codec import BatchEncoder, BatchDecoder
+
+# Compression ratio and throughput of the batch codec
+# on a synthetic series of 0x5021 (Latest data long) at 1 record/s
+
+RECORDS = 3600      # Records of a series
+BATCH = 60          # Records per batch
+REPEAT = 5
+
+def series(count, seed=1):
+    # Raw frames (address + payload) of slowly changing indoor conditions
+    rnd = random.Random(seed)
+    fmt = DataParser.generate_struct_format(DataParser.FIELDS[0x5021])
+    temp, humi, light, press, noise, tvoc, co2 = 2450, 4500, 320, 1013250, 4200, 50, 600
+    frames = []
+    for n in range(count):
+        temp += rnd.choice((-1, 0, 0, 0, 1))
+        humi += rnd.choice((-2, -1, 0, 0, 1, 2))
+        light = max(0, light + rnd.randint(-3, 3))
+        press += rnd.randint(-15, 15)
+        noise = 3500 + rnd.randint(0, 1500)     # Noisy
+        tvoc = max(0, tvoc + rnd.randint(-2, 2))
+        co2 = max(400, co2 + rnd.randint(-5, 5))
+        thi = int(0.81 * temp + 0.01 * humi * (0.99 * temp - 1430) / 100 + 4630)
+        wbgt = temp - 400
+        frames.append(struct.pack("<H", 0x5021) + struct.pack(fmt,
+            n & 0xff, temp, humi, light, press, noise, tvoc, co2, thi, wbgt,
+            0, 0, 0, 0, *[0] * 9, 0, 0, 0))
+    return frames
+
+def measure(func, repeat=REPEAT):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        res = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return res, best
+
+frames = series(RECORDS)
+parser = DataParser(timestamp=True)
+records = []
+t0 = 1700000000.0
+for n, frame in enumerate(frames):
+    records.append(parser.parse(frame, received=(float(n), t0 + n)))
+batches = [records[n:n + BATCH] for n in range(0, len(records), BATCH)]
+
+enc = BatchEncoder(0x5021)
+payloads, t_enc = measure(lambda: [enc.encode(b) for b in batches])
+decoded, t_dec = measure(lambda: BatchDecoder().feed(b"".join(payloads)))
+assert [tuple(r[:-1]) for r in decoded] == [tuple(r[:-2]) for r in records]
+
+size_frame = sum(len(f) + 4 + 2 for f in frames)    # Serial response incl. header and CRC
+size_json = len(json.dumps([{k: str(v) for k, v in r._asdict().items() if k != "mono"} for r in records]))
+size_codec = sum(len(p) for p in payloads)
+
+print(f"Records             : {RECORDS} ({BATCH} per batch)")
+print(f"Serial frames       : {size_frame:8d} bytes")
+print(f"JSON                : {size_json:8d} bytes")
+print(f"Batch codec         : {size_codec:8d} bytes ({size_codec / RECORDS:.1f} bytes/record)")
+print(f"Ratio (frames/codec): {size_frame / size_codec:.1f}")
+print(f"Ratio (JSON/codec)  : {size_json / size_codec:.1f}")
+print(f"Encode              : {RECORDS / t_enc:10.0f} records/s")
+print(f"Decode              : {RECORDS / t_dec:10.0f} records/s")
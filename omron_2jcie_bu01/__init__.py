@@ -44,6 +44,7 @@ Example::
 """
 
 import struct
+import time
 from collections import namedtuple
 from decimal import Decimal
 
@@ -51,6 +52,10 @@ __author__  = "Nobuo Okazaki"
 __version__ = "0.1.0"
 __license__ = "MIT License"
 
+# Exceptions for skipping packets
+class SkipData(Exception): pass
+class NotTarget(SkipData): pass
+
 class Omron2JCIE_BU01(object):
     # Base class for Serial/BLE implementation
 
@@ -58,23 +63,76 @@ class Omron2JCIE_BU01(object):
     VI = ["NONE", "During vibration (Earthquake judgment in progress)", "During earthquake"]
 
     @classmethod
-    def serial(cls, portname):
+    def serial(cls, portname, timestamp=False, ttl=0):
         from .serial import Omron2JCIE_BU01_Serial
-        return Omron2JCIE_BU01_Serial(portname)
+        return Omron2JCIE_BU01_Serial(portname, timestamp, ttl)
 
     @classmethod
-    def ble(cls, device_address=None):
+    def ble(cls, device_address=None, timestamp=False):
         from .ble import Omron2JCIE_BU01_BLE
-        return Omron2JCIE_BU01_BLE(device_address)
+        return Omron2JCIE_BU01_BLE(device_address, timestamp)
 
     def get(self, address, data=b"", name=None):
         # Write command, get the response data and parse it
         raise NotImplementedError()
 
+    def get_raw(self, address):
+        # Read address and return the data body (address + payload) without parsing
+        raise NotImplementedError()
+
+    def _track(self, key, tpl):
+        # Account sequence number of the data for loss statistics
+        seq = getattr(tpl, "seq", None)
+        if seq is not None: self.tracker.update(key, seq)
+        return tpl
+
+    def loss_stats(self):
+        # Sequence statistics of each stream -- {key: stream_stats}
+        # Keys are address for get(), ("notify", address) for notification
+        # and ("adv", datatype) for scan.
+        return self.tracker.stats()
+
+    def sleep(self, seconds):
+        # Wait for seconds
+        time.sleep(seconds)
+
+    def poll(self, address, interval=1.0, count=None, deadband=None, adaptive=False):
+        # Read address repeatedly and yield parsed data
+        # - interval -- polling interval (seconds)
+        # - count    -- number of reads, None for infinite
+        # - deadband -- DeadbandFilter, data without meaningful change are not yielded
+        # - adaptive -- poll at the update period of the device and yield only
+        #               updated data (see AdaptivePoller), count is the number of
+        #               updated data and interval is the initial guess of the period
+        if adaptive:
+            from .poller import AdaptivePoller
+            yield from AdaptivePoller(self, address, interval, deadband=deadband).iterate(count)
+            return
+
+        n = 0
+        while count is None or n < count:
+            started = time.monotonic()
+            tpl = self.get(address)
+            n += 1
+            if deadband is None or deadband.check(tpl, (id(self), address)): yield tpl
+            wait = interval - (time.monotonic() - started)
+            if wait > 0 and (count is None or n < count): self.sleep(wait)
+
+    def get_many(self, address, datas, name=None):
+        # Write commands for address with each data and return the parsed responses
+        # Implementations may pipeline the requests
+        return [self.get(address, data, name) for data in datas]
+
     def vibration_count(self):
         # 4.5.7 Vibration count (Address: 0x5031)
         return self.get(0x5031)
 
+    @classmethod
+    def is_vibrating(cls, tpl):
+        # Vibration information of the data indicates vibration or earthquake
+        # See VI for the description
+        return bool(getattr(tpl, "vibration", 0))
+
     def led(self, rule=None, rgb=None):
         # 4.5.8 LED setting [normal state] (Address: 0x5111)
         # Get/Set LED setting
@@ -100,9 +158,55 @@ class Omron2JCIE_BU01(object):
         data = struct.pack("<HB", interval, mode)
         return self.get(0x5115, data)
 
+class AdvertisementAssembler(object):
+    # Parse advertising data and reassemble ADV_IND and ADV_RSP of active scan
+    # Raises NotTarget for data which does not complete a record.
+    # - tracker -- SequenceTracker, sequence numbers of all received data
+    #              (ADV_IND for active scan) are accounted in ("adv", datatype)
+    #              including those excluded by distinct
+    def __init__(self, parser, tracker=None):
+        self.parser = parser
+        self.tracker = tracker
+        self.seq = {}           # for Active scan
+        self.last_seqno = None  # for distinct in scan
+
+    def parse(self, data, distinct=True, received=None):
+        # - distinct -- exclude same sequence number
+        # - received -- receive time, see DataParser
+        datatype, seqno = data[0], data[1]
+        if self.tracker is not None and (datatype not in (0x03, 0x04) or len(data) == 19):
+            self.tracker.update(("adv", datatype), seqno)
+        if datatype in (0x03, 0x04):
+            # For active scan
+            if len(data) == 19 and seqno not in self.seq:
+                # Parse ADV_IND
+                if distinct and seqno == self.last_seqno: raise NotTarget()
+                self.last_seqno = seqno
+                self.seq[seqno] = self.parser.parse_adv(data, received=received)
+                raise NotTarget()   # Will proceed ADV_RSP
+
+            if len(data) == 27 and seqno in self.seq:
+                # Parse ADV_RSP
+                # Add fields to ADV_IND
+                a = self.parser.parse_adv(data, received=received)
+                dct = self.seq.pop(seqno)._asdict()
+                dct.update(a._asdict())
+                return self.parser.get_adv_namedtuple(datatype)(**dct)
+            raise NotTarget()
+        # For passive scan
+        if distinct and seqno == self.last_seqno: raise NotTarget()
+        self.last_seqno = seqno
+        return self.parser.parse_adv(data, received=received)
+
+# Acceleration waveform downloaded by acceleration_memory()
+AccelerationWaveform = namedtuple("acceleration_waveform",
+    ["type", "index", "si", "pga", "seismic_intensity", "x", "y", "z"])
+
 class DataParser(object):
     # Parser for data body
     # Common for Serial/BLE
+    # - timestamp -- add receive time fields to parsed data
+    #   mono: time.monotonic(), time: time.time()
     TYPE = {
         "UInt8" : "B",  # unsigned short
         "UInt16": "H",  # unsigned int
@@ -181,6 +285,17 @@ class DataParser(object):
             ("earthquake",      "Earthquake count",      "UInt32", 1, ""),
             ("vibration",       "Vibration count",       "UInt32", 1, ""),
         ],
+        0x503E: [
+            ("type",            "Acceleration data type",      "UInt8",  1, ""),
+            ("index",           "Memory index",                "UInt8",  1, ""),
+            ("pages",           "Total transfer count",        "UInt16", 1, ""),
+            ("si",              "SI value",                    "UInt16", 10,   "kine"),
+            ("pga",             "PGA",                         "UInt16", 10,   "gal"),
+            ("seismic_intensity", "Seismic intensity",         "UInt16", 1000, ""),
+            ("max_x",           "Maximum acceleration (X-axis)", "SInt16", 10, "gal"),
+            ("max_y",           "Maximum acceleration (Y-axis)", "SInt16", 10, "gal"),
+            ("max_z",           "Maximum acceleration (Z-axis)", "SInt16", 10, "gal"),
+        ],
         0x5111: [
             ("rule",            "Display rule (normal state)", "UInt16", 1, ""),
             ("red",             "Intensity of LED (Red)",      "UInt8",  1, ""),
@@ -200,10 +315,16 @@ class DataParser(object):
         0x5013: "latest_calculation_data",
         0x5021: "latest_data_long",
         0x5031: "vibration_count",
+        0x503E: "acceleration_memory_header",
         0x5111: "led_setting",
         0x5115: "advertise_setting",
     }
 
+    TIMESTAMP = ["mono", "time"]
+
+    def __init__(self, timestamp=False):
+        self.timestamp = timestamp
+
     @classmethod
     def generate_struct_format(cls, fields):
         # Generate format for struct.unpack from fields
@@ -213,8 +334,9 @@ class DataParser(object):
             else: fmt += cls.TYPE[fld[2]]
         return fmt
 
-    def _parse_content(self, data, fields, tplname):
+    def _parse_content(self, data, fields, tplname, received=None):
         # Parse main data
+        # - received -- tuple(monotonic, wall-clock) of receive time, default is now
         fmt = self.generate_struct_format(fields)
         a = list(struct.unpack(fmt, data))
         for idx in range(len(fields)):
@@ -222,17 +344,20 @@ class DataParser(object):
             if fld[0] != "_reserved" and fld[3] != 1:
                 a[idx] = Decimal(a[idx]) / fld[3]
         names = [f[0] for f in filter(lambda x: not x[0].startswith("_"), fields)]
+        if self.timestamp:
+            names += self.TIMESTAMP
+            a += received or (time.monotonic(), time.time())
         nmd = namedtuple(tplname, names)
         return nmd(*a)
 
-    def parse(self, data, tplname=None):
+    def parse(self, data, tplname=None, received=None):
         # Parse for communication data
         address = struct.unpack("<H", data[:2])[0]
         if address not in self.FIELDS: return data
         tplname = tplname or self.TPLNAME.get(address, f"Address_0x{address:04x}")
-        return self._parse_content(data[2:], self.FIELDS[address], tplname)
+        return self._parse_content(data[2:], self.FIELDS[address], tplname, received)
 
-    def parse_adv(self, data, tplname=None):
+    def parse_adv(self, data, tplname=None, received=None):
         # Parse for advertising data
         datatype = data[0]
         if datatype not in self.ADV: return data
@@ -241,15 +366,16 @@ class DataParser(object):
             if len(data) == 19: pk = "ind"
             elif len(data) == 27: pk = "rsp"
             tplname = tplname or f"Adv_0x{datatype:02x}{pk}"
-            return self._parse_content(data, self.ADV[datatype][pk], tplname)
+            return self._parse_content(data, self.ADV[datatype][pk], tplname, received)
 
         tplname = tplname or self.TPLNAME.get(datatype, f"Adv_0x{datatype:02x}")
-        return self._parse_content(data, self.ADV[datatype], tplname)
+        return self._parse_content(data, self.ADV[datatype], tplname, received)
 
     def get_adv_namedtuple(self, datatype, name=None):
         # Create named tuple for special use
         if datatype == 0x03:
             fields = self.ADV_TYPE + self.SEQ + self.SENSING + self.CALCULATION + self.ACCELERATION
         names = [fld[0] for fld in fields]
+        if self.timestamp: names += self.TIMESTAMP
         tplname = name or self.TPLNAME.get(datatype, f"Adv_0x{datatype:02x}")
         return namedtuple(tplname, names)
@@ -0,0 +1,227 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.aggregate
+"""
+Windowed aggregation of sensing records.
+
+Records obtained by get(), scan() or start_notify() are reduced to running
+statistics (count/min/max/mean and streaming quantiles) per device, field and
+window. A summary record is passed to the callback when each window closes.
+Memory and time per sample do not depend on the number of samples in a
+window; a sample updates one accumulator per window containing it
+(window / slide for sliding windows, one for tumbling windows).
+
+Example::
+
+    from omron_2jcie_bu01 import Omron2JCIE_BU01
+    from omron_2jcie_bu01.aggregate import WindowAggregator
+
+    def on_summary(summary):
+        print(summary.device, summary.start, summary.stats["temperature"])
+
+    # Tumbling window: 1 minute
+    agg = WindowAggregator(on_summary, window=60)
+    sensor = Omron2JCIE_BU01.ble("AA:BB:CC:DD:EE:FF")
+    sensor.scan(agg.scan_callback("AA:BB:CC:DD:EE:FF"), scantime=3600)
+    agg.flush()
+
+    # Sliding window: 1 hour, emitted every 5 minutes
+    agg = WindowAggregator(on_summary, window=3600, slide=300)
+"""
+import math
+import time
+import traceback
+from collections import namedtuple
+
+# Summary of a field in a window
+FieldSummary = namedtuple("field_summary", ["count", "min", "max", "mean", "quantiles"])
+
+# Summary of a window
+WindowSummary = namedtuple("window_summary", ["device", "start", "end", "count", "stats"])
+
+class P2Quantile(object):
+    # Streaming quantile estimator by P-square algorithm
+    # (R. Jain and I. Chlamtac, 1985)
+    # Keeps only 5 markers, so memory and cost per sample are constant.
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self.q = []                                         # Marker heights
+        self.n = [0, 1, 2, 3, 4]                            # Marker positions
+        self.np = [0, 2 * p, 4 * p, 2 + 2 * p, 4]           # Desired positions
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]             # Increments of desired positions
+
+    def add(self, x):
+        self.count += 1
+        q, n = self.q, self.n
+        if self.count <= 5:
+            # Store first 5 samples as is
+            q.append(x)
+            q.sort()
+            return
+
+        # Find cell k which x falls in, and update extreme values
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]: k += 1
+
+        for i in range(k + 1, 5): n[i] += 1
+        for i in range(5): self.np[i] += self.dn[i]
+
+        # Adjust heights of middle markers
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = self._parabolic(i, d)
+                if not q[i - 1] < qp < q[i + 1]: qp = self._linear(i, d)
+                q[i] = qp
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.q, self.n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i, d):
+        q, n = self.q, self.n
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+    def value(self):
+        # Estimated quantile (None if no samples)
+        if not self.count: return None
+        if self.count <= 5:
+            # Exact value from stored samples
+            return self.q[int(round(self.p * (self.count - 1)))]
+        return self.q[2]
+
+class RunningStats(object):
+    # Running statistics of a field
+    def __init__(self, quantiles):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.sketches = [P2Quantile(p) for p in quantiles]
+
+    def add(self, x):
+        self.count += 1
+        self.total += x
+        if x < self.min: self.min = x
+        if x > self.max: self.max = x
+        for sk in self.sketches: sk.add(x)
+
+    def summary(self):
+        return FieldSummary(
+            self.count, self.min, self.max, self.total / self.count,
+            {sk.p: sk.value() for sk in self.sketches})
+
+class WindowAggregator(object):
+    # Aggregate records into tumbling or sliding windows
+    # - callback  -- called with WindowSummary when a window closes
+    # - window    -- window length (seconds)
+    # - slide     -- window step (seconds), None for tumbling window
+    # - fields    -- names of fields to aggregate, None for all numeric fields
+    # - quantiles -- quantiles estimated by P-square algorithm
+    #
+    # Windows are closed by the time of incoming samples, call flush() to close
+    # windows remaining at the end of acquisition.
+    EXCLUDE = ("type", "seq", "mono", "time")
+
+    def __init__(self, callback, window=60, slide=None, fields=None, quantiles=(0.5, 0.9, 0.99)):
+        if slide is None: slide = window
+        if slide <= 0 or window <= 0: raise ValueError("window and slide must be positive.")
+        # Windows are identified by integer index k, starting at k * slide
+        self._span = round(window / slide)  # Number of slides in a window
+        if self._span < 1 or abs(self._span * slide - window) > 1e-9 * window:
+            raise ValueError("window must be a multiple of slide.")
+        self.callback = callback
+        self.window = window
+        self.slide = slide
+        self.fields = fields
+        self.quantiles = tuple(quantiles)
+        self.dropped = 0    # Number of samples arrived after their windows were closed
+        self._windows = {}  # device -> {index: {field: RunningStats}}
+        self._closed = {}   # device -> end (in index) of the last closed window
+
+    def _select(self, tpl):
+        # Pick up (name, value) to be aggregated
+        if self.fields is not None:
+            names = self.fields
+        else:
+            names = [f for f in tpl._fields if f not in self.EXCLUDE and not f.startswith("f_")]
+        for name in names:
+            value = getattr(tpl, name, None)
+            if value is None or isinstance(value, (str, bytes)): continue
+            yield name, float(value)
+
+    def add(self, tpl, device=None, t=None):
+        # Add a record
+        # - device -- key for distinguishing devices (e.g. address)
+        # - t      -- timestamp of the record
+        #             (default: time field of the record or time.time())
+        if t is None: t = getattr(tpl, "time", None) or time.time()
+        kt = self._index(t)
+        self._expire(device, kt)
+        if kt < self._closed.get(device, -math.inf):
+            self.dropped += 1
+            return
+
+        windows = self._windows.setdefault(device, {})
+        values = list(self._select(tpl))
+        for k in range(kt - self._span + 1, kt + 1):
+            acc = windows.get(k)
+            if acc is None:
+                acc = windows[k] = {"_count": 0}
+            acc["_count"] += 1
+            for name, value in values:
+                st = acc.get(name)
+                if st is None: st = acc[name] = RunningStats(self.quantiles)
+                st.add(value)
+
+    def _index(self, t):
+        # Index of the slide containing t; a time on a boundary (within
+        # rounding error) belongs to the slide starting there
+        return math.floor(t / self.slide + 1e-9)
+
+    def _expire(self, device, kt):
+        # Close windows which end at or before slide index kt
+        windows = self._windows.get(device)
+        if not windows: return
+        for k in sorted(k for k in windows if k + self._span <= kt):
+            self._emit(device, k, windows.pop(k))
+
+    def _emit(self, device, k, acc):
+        self._closed[device] = max(self._closed.get(device, -math.inf), k + self._span)
+        count = acc.pop("_count")
+        start, end = k * self.slide, (k + self._span) * self.slide
+        summary = WindowSummary(device, start, end, count, {n: v.summary() for n, v in acc.items()})
+        try: self.callback(summary)
+        except Exception as e: traceback.print_exc()
+
+    def advance(self, t=None):
+        # Close windows which ended by t for all devices (e.g. from a timer)
+        if t is None: t = time.time()
+        kt = self._index(t)
+        for device in list(self._windows): self._expire(device, kt)
+
+    def flush(self):
+        # Close all windows regardless of time
+        for device, windows in list(self._windows.items()):
+            for k in sorted(windows): self._emit(device, k, windows.pop(k))
+
+    def scan_callback(self, device=None):
+        # Callback for scan() -- callback(tpl)
+        def _callback(tpl): self.add(tpl, device)
+        return _callback
+
+    def notify_callback(self, device=None):
+        # Callback for start_notify() -- callback(sender, tpl)
+        def _callback(sender, tpl): self.add(tpl, device)
+        return _callback
@@ -4,51 +4,67 @@ import asyncio
 import struct
 import traceback, platform
 from warnings import warn
-from bleak import BleakClient, BleakScanner, discover
-from . import Omron2JCIE_BU01, DataParser
+from bleak import BleakClient, BleakScanner
+from . import Omron2JCIE_BU01, DataParser, AdvertisementAssembler, SkipData, NotTarget
+from .capture import CaptureWriter
+from .discovery import DeviceCache, discover
+from .sequence import SequenceTracker
 
 # Exceptions for skipping packets
-class SkipData(Exception): pass
-class NotTarget(SkipData): pass
 class NoManufacturerData(SkipData): pass
 
+class _BleakClientWrapper(object):
+    # Wrapper class for async coroutine of BleakClient
+    def __init__(self, address, loop):
+        self._bleak_client = BleakClient(address)
+        self.loop = loop
+
+    def __getattr__(self, name):
+        func = getattr(self._bleak_client, name)
+        def _wrapper(*args, **kw):
+            return self.loop.run_until_complete(func(*args, **kw))
+        return _wrapper
+
 class Omron2JCIE_BU01_BLE(Omron2JCIE_BU01):
     # Operate OMRON 2JCIE-BU01 via BLE
     BASEUUID = "ab70{addr:04x}-0a3a-11e8-ba89-0ed5f89f718b"
+    DISCOVER_TIMEOUT = 5.0
 
-    def __init__(self, device_address=None):
+    def __init__(self, device_address=None, timestamp=False):
         # If device_address is not specified, discover devices and set address
+        # The scan stops as soon as a device named "Rbt" or a known device in
+        # DeviceCache is found.
+        # - timestamp -- add receive time (mono, time) to parsed data
         self.loop = asyncio.get_event_loop()
         if device_address:
             self.address = device_address
         else:
-            async def _discover_devices():
-                for dev in await discover():
-                    if dev.name == "Rbt": return dev.address
-            self.address = self.loop.run_until_complete(_discover_devices())
+            found = discover(1, None, self.DISCOVER_TIMEOUT, loop=self.loop,
+                known=DeviceCache().addresses())
+            self.address = found[0].address if found else None
 
         if not self.address:
             raise RuntimeError("Device address could not be determined.")
 
-        self.seq = {}           # for Active scan
-        self.parser = DataParser()
-        self.last_seqno = None  # for distinct in scan
+        self.parser = DataParser(timestamp)
+        self.tracker = SequenceTracker()
+        self.assembler = AdvertisementAssembler(self.parser, self.tracker)
+        self.capture = None     # CaptureWriter for raw data
 
         # Initialize wrapper for coroutine
-        class _BleakClientWrapper(object):
-            # Wrapper class for async coroutine of BleakClient
-            def __init__(self, address, loop):
-                self._bleak_client = BleakClient(address)
-                self.loop = loop
-
-            def __getattr__(self, name):
-                func = getattr(self._bleak_client, name)
-                def _wrapper(*args, **kw):
-                    return self.loop.run_until_complete(func(*args, **kw))
-                return _wrapper
-
         self.client = _BleakClientWrapper(self.address, self.loop)
 
+    def use_loop(self, loop):
+        # Run BLE operations on loop, returns the previous loop
+        # The device must be disconnected. The loop should be the current event
+        # loop of the thread when called, because BleakClient may bind to it.
+        if self.is_connected():
+            raise RuntimeError("Disconnect before changing the event loop.")
+        prev = self.loop
+        self.loop = loop
+        self.client = _BleakClientWrapper(self.address, loop)
+        return prev
+
     @classmethod
     def uuid(cls, characteristic_address):
         # Service UUID
@@ -108,33 +124,16 @@ class Omron2JCIE_BU01_BLE(Omron2JCIE_BU01):
                 except Exception as e: traceback.print_exc()
 
     def _parse_advertisement(self, data, distinct):
-        datatype, seqno = data[0], data[1]
-        if datatype in (0x03, 0x04):
-            # For active scan
-            if len(data) == 19 and seqno not in self.seq:
-                # Parse ADV_IND
-                if distinct and seqno == self.last_seqno: raise NotTarget()
-                self.last_seqno = seqno
-                self.seq[seqno] = self.parser.parse_adv(data)
-                raise NotTarget()   # Will proceed ADV_RSP
-
-            if len(data) == 27 and seqno in self.seq:
-                # Parse ADV_RSP
-                # Add fields to ADV_IND
-                a = self.parser.parse_adv(data)
-                dct = self.seq.pop(seqno)._asdict()
-                dct.update(a._asdict())
-                return self.parser.get_adv_namedtuple(datatype)(**dct)
-            raise NotTarget()
-        # For passive scan
-        if distinct and seqno == self.last_seqno: raise NotTarget()
-        self.last_seqno = seqno
-        return self.parser.parse_adv(data)
-
-    def scan(self, callback, scantime=10, active=False, distinct=True):
+        if self.capture: self.capture.write(CaptureWriter.ADVERTISEMENT, 0, data)
+        return self.assembler.parse(data, distinct)     # Tracked by assembler
+
+    def scan(self, callback, scantime=10, active=False, distinct=True, deadband=None):
         # Scan advertising packet
         # active   -- active scan (for 0x03, 0x04)
         # distinct -- exclude same sequence number
+        # deadband -- DeadbandFilter, exclude data without meaningful change
+        if deadband is not None: callback = deadband.wrap(callback, self.address)
+
         async def _scan(loop):
             # Wrapped function for detection_callback
             def _wrapped(sender, eventargs):
@@ -196,9 +195,19 @@ class Omron2JCIE_BU01_BLE(Omron2JCIE_BU01):
         if not self.is_connected(): self.connect()
         if data:
             if isinstance(data, bytes): data = bytearray(data)
-            return self.client.write_gatt_char(self.uuid(chara), data)
-        res = self.client.read_gatt_char(self.uuid(chara))
-        return self.parser.parse(struct.pack("<H", chara) + res, name)
+            self.client.write_gatt_char(self.uuid(chara), data)
+            # Return the written setting in the same form as reading
+            return self.parser.parse(struct.pack("<H", chara) + bytes(data), name)
+        res = struct.pack("<H", chara) + bytes(self.client.read_gatt_char(self.uuid(chara)))
+        if self.capture: self.capture.write(CaptureWriter.RESPONSE, chara, res)
+        return self._track(chara, self.parser.parse(res, name))
+
+    def get_raw(self, chara):
+        # Read characteristic and return the data body (address + payload) without parsing
+        if not self.is_connected(): self.connect()
+        res = struct.pack("<H", chara) + bytes(self.client.read_gatt_char(self.uuid(chara)))
+        if self.capture: self.capture.write(CaptureWriter.RESPONSE, chara, res)
+        return res
 
     def latest_sensing_data(self):
         # 2.2 Latest Data Service (Service UUID: 0x5010)
@@ -210,7 +219,7 @@ class Omron2JCIE_BU01_BLE(Omron2JCIE_BU01):
         # 0x5013: Latest calculation data
         return self.get(0x5013)
 
-    def start_notify(self, chara, callback):
+    def start_notify(self, chara, callback, deadband=None):
         """ Activate notifications on a characteristic
 
                 def callback(sender, tpl):
@@ -220,13 +229,18 @@ class Omron2JCIE_BU01_BLE(Omron2JCIE_BU01):
                 sensor.sleep(5)
                 sensor.stop_notify(0x5012)
                 sensor.stop_notify(0x5013)
+
+            If deadband(DeadbandFilter) is specified, data without meaningful
+            change will not be passed to the callback.
         """
         # If not connected, connect first
         if not self.is_connected(): self.connect()
+        if deadband is not None: callback = deadband.wrap_notify(callback, (self.address, chara))
 
         def _on_notify(sender, data):
             # Callback for notify
-            tpl = self.parser.parse(struct.pack("<H", chara) + data)
+            if self.capture: self.capture.write(CaptureWriter.NOTIFY, chara, data)
+            tpl = self._track(("notify", chara), self.parser.parse(struct.pack("<H", chara) + data))
             try: callback(sender, tpl)
             except Exception as e: traceback.print_exc()
 
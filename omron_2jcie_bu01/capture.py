@@ -0,0 +1,150 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.capture
+"""
+Capture of raw data from the device and replay of captured data.
+
+Set a CaptureWriter to sensor.capture to record raw responses, notifications
+and advertising data with receive time. Replayer feeds a capture file back
+through DataParser, reassembly of advertising data and the callbacks at real
+time, N times speed or as fast as possible.
+
+Example::
+
+    from omron_2jcie_bu01 import Omron2JCIE_BU01
+    from omron_2jcie_bu01.capture import CaptureWriter, Replayer
+
+    sensor = Omron2JCIE_BU01.ble("AA:BB:CC:DD:EE:FF")
+    with CaptureWriter("bu01.cap") as cap:
+        sensor.capture = cap
+        sensor.start_notify(0x5012, on_notify)
+        sensor.sleep(600)
+        sensor.stop_notify(0x5012)
+        sensor.capture = None
+
+    # Replay at 10x speed
+    stats = Replayer("bu01.cap").run(on_notify=on_notify, speed=10)
+
+    # As fast as possible (throughput benchmark)
+    stats = Replayer("bu01.cap").run(on_notify=on_notify, speed=None)
+    print(stats.records / stats.elapsed, "records/s")
+
+File format:
+    Header: magic(4s) version(B)
+    Record: kind(B) mono(d) time(d) key(H) length(H) data
+"""
+import struct
+import time
+import traceback
+from collections import namedtuple
+from . import DataParser, AdvertisementAssembler, SkipData
+from .sequence import SequenceTracker
+
+# Captured record
+CaptureRecord = namedtuple("capture_record", ["kind", "mono", "time", "key", "data"])
+
+# Result of replay
+ReplayStats = namedtuple("replay_stats", ["records", "parsed", "skipped", "elapsed"])
+
+class CaptureWriter(object):
+    # Write raw data to a capture file
+    MAGIC = b"OMCP"
+    VERSION = 1
+    RECORD = struct.Struct("<BddHH")
+
+    # Kind of record, key is
+    RESPONSE = 1        # address; data is address + payload (serial response, BLE read)
+    NOTIFY = 2          # characteristic address; data is payload
+    ADVERTISEMENT = 3   # 0; data is manufacturer data
+
+    def __init__(self, path):
+        self.f = open(path, "wb")
+        self.f.write(self.MAGIC + bytes([self.VERSION]))
+        self.count = 0
+
+    def write(self, kind, key, data, mono=None, wall=None):
+        if mono is None: mono = time.monotonic()
+        if wall is None: wall = time.time()
+        data = bytes(data)
+        self.f.write(self.RECORD.pack(kind, mono, wall, key, len(data)) + data)
+        self.count += 1
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def read_capture(path):
+    # Generator of CaptureRecord in a capture file
+    rec = CaptureWriter.RECORD
+    with open(path, "rb") as f:
+        header = f.read(5)
+        if header[:4] != CaptureWriter.MAGIC: raise ValueError("Not a capture file.")
+        if header[4] != CaptureWriter.VERSION: raise ValueError(f"Unsupported version: {header[4]}")
+        while True:
+            head = f.read(rec.size)
+            if len(head) < rec.size: return
+            kind, mono, wall, key, length = rec.unpack(head)
+            data = f.read(length)
+            if len(data) < length: return     # Truncated
+            yield CaptureRecord(kind, mono, wall, key, data)
+
+class Replayer(object):
+    # Replay a capture file
+    # - timestamp -- add original receive time (mono, time) to parsed data
+    def __init__(self, path, timestamp=True):
+        self.path = path
+        self.parser = DataParser(timestamp)
+        self.tracker = SequenceTracker()
+        self.assembler = AdvertisementAssembler(self.parser, self.tracker)
+
+    def _track(self, key, tpl):
+        seq = getattr(tpl, "seq", None)
+        if seq is not None: self.tracker.update(key, seq)
+        return tpl
+
+    def run(self, on_response=None, on_notify=None, on_scan=None, speed=1.0, distinct=True):
+        # Feed captured data to the callbacks
+        # - on_response -- callback(tpl) for responses
+        # - on_notify   -- callback(sender, tpl) for notifications, sender is the address
+        # - on_scan     -- callback(tpl) for advertising data
+        # - speed       -- 1.0 for real time, N for N times speed, None for as fast as possible
+        # - distinct    -- exclude advertising data with the same sequence number
+        # Returns ReplayStats
+        records = parsed = skipped = 0
+        started = time.monotonic()
+        origin = None
+        for rec in read_capture(self.path):
+            records += 1
+            if speed:
+                if origin is None: origin = rec.mono
+                wait = started + (rec.mono - origin) / speed - time.monotonic()
+                if wait > 0: time.sleep(wait)
+
+            received = (rec.mono, rec.time)
+            try:
+                if rec.kind == CaptureWriter.RESPONSE:
+                    tpl = self._track(rec.key, self.parser.parse(rec.data, received=received))
+                    callback, args = on_response, (tpl,)
+                elif rec.kind == CaptureWriter.NOTIFY:
+                    data = struct.pack("<H", rec.key) + rec.data
+                    tpl = self._track(("notify", rec.key), self.parser.parse(data, received=received))
+                    callback, args = on_notify, (rec.key, tpl)
+                elif rec.kind == CaptureWriter.ADVERTISEMENT:
+                    tpl = self.assembler.parse(rec.data, distinct, received)
+                    callback, args = on_scan, (tpl,)
+                else:
+                    skipped += 1
+                    continue
+            except SkipData:
+                skipped += 1
+                continue
+
+            parsed += 1
+            if callback is None: continue
+            try: callback(*args)
+            except Exception as e: traceback.print_exc()
+        return ReplayStats(records, parsed, skipped, time.monotonic() - started)
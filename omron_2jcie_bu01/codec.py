@@ -0,0 +1,216 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.codec
+"""
+Compact batch encoding of records for uplink.
+
+A run of records of the same address is encoded column by column. Each column
+holds the raw integers of a field (as sent by the device), the first value
+as is and the others as the difference from the previous value, in zigzag
+varint. Columns of slowly changing values shrink to about one byte per
+record, and columns of constant values or steps (flags, sequence number,
+time) are stored as runs of the same difference. The field layout is taken from DataParser.FIELDS and ADV.
+
+Batch format::
+
+    length(varint) key(H) flags(B) count(varint) columns...
+    - key    -- address (e.g. 0x5021) or data type of advertising (0x01, 0x03)
+    - flags  -- bit 0: a column of time (milliseconds) follows the fields
+    - column -- mode(B) and differences, see MODE_DELTA and MODE_RUN
+
+Example::
+
+    from omron_2jcie_bu01.codec import BatchEncoder, BatchDecoder
+
+    enc = BatchEncoder(0x5021)
+    payload = enc.encode(records)           # list of latest_data_long
+
+    dec = BatchDecoder()
+    for tpl in dec.feed(payload):           # payload may arrive in pieces
+        print(tpl)
+"""
+import struct
+from collections import namedtuple
+from decimal import Decimal
+from . import DataParser
+
+FLAG_TIME = 0x01
+
+# Encoding of a column
+MODE_DELTA = 0     # zigzag varint of each difference
+MODE_RUN = 1       # runs of the same difference: count(varint) (difference, length)...
+
+def zigzag(n):
+    # Map signed integer to unsigned: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ...
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def unzigzag(n):
+    return (n >> 1) ^ -(n & 1)
+
+def write_varint(out, n):
+    # Append unsigned varint to bytearray
+    while n > 0x7f:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def read_varint(buf, pos):
+    # Returns tuple(value, next position), raises IndexError if incomplete
+    n = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80: return n, pos
+        shift += 7
+
+def layout(key):
+    # Fields (without reserved) of address or advertising data type
+    if key in DataParser.FIELDS:
+        fields = DataParser.FIELDS[key]
+        tplname = DataParser.TPLNAME.get(key, f"Address_0x{key:04x}")
+    elif key == 0x01:
+        fields = DataParser.ADV[0x01]
+        tplname = "Adv_0x01"
+    elif key == 0x03:
+        p = DataParser
+        fields = p.ADV_TYPE + p.SEQ + p.SENSING + p.CALCULATION + p.ACCELERATION
+        tplname = "Adv_0x03"
+    else:
+        raise ValueError(f"Unknown key: 0x{key:04x}")
+    return [f for f in fields if not f[0].startswith("_")], tplname
+
+class BatchEncoder(object):
+    # Encode records of a key (address or advertising data type)
+    # - timestamp -- encode time field of records (milliseconds)
+    def __init__(self, key=0x5021, timestamp=None):
+        self.key = key
+        self.fields, _ = layout(key)
+        self.timestamp = timestamp
+
+    def encode(self, records):
+        # Encode a batch of records, returns bytes
+        records = list(records)
+        timestamp = self.timestamp
+        if timestamp is None: timestamp = bool(records) and "time" in records[0]._fields
+
+        out = bytearray()
+        out += struct.pack("<HB", self.key, FLAG_TIME if timestamp else 0)
+        write_varint(out, len(records))
+        for idx, fld in enumerate(self.fields):
+            unit = fld[3]
+            if unit == 1: column = [int(tpl[idx]) for tpl in records]
+            else: column = [int(tpl[idx] * unit) for tpl in records]
+            self._encode_column(out, column, fld[2] == "UInt8")
+        if timestamp:
+            self._encode_column(out, [int(round(tpl.time * 1000)) for tpl in records], False)
+
+        res = bytearray()
+        write_varint(res, len(out))
+        return bytes(res + out)
+
+    def _encode_column(self, out, column, wrap8):
+        deltas = []
+        prev = 0
+        for v in column:
+            d = v - prev
+            # Differences of 8-bit values (e.g. sequence number) wrap around
+            if wrap8: d = ((d + 128) & 0xff) - 128
+            deltas.append(d)
+            prev = v
+
+        # Runs of the same difference (flags, sequence number, time)
+        runs = []
+        for d in deltas:
+            if runs and runs[-1][0] == d: runs[-1][1] += 1
+            else: runs.append([d, 1])
+
+        if len(runs) * 2 <= len(deltas):
+            out.append(MODE_RUN)
+            write_varint(out, len(runs))
+            for d, n in runs:
+                write_varint(out, zigzag(d))
+                write_varint(out, n)
+            return
+        out.append(MODE_DELTA)
+        for d in deltas: write_varint(out, zigzag(d))
+
+class BatchDecoder(object):
+    # Streaming decoder of batches
+    # - raw -- return raw integers instead of scaled values (Decimal)
+    # Malformed batches are skipped by feed() and counted in dropped.
+    def __init__(self, raw=False):
+        self.raw = raw
+        self.dropped = 0
+        self._buf = bytearray()
+        self._layouts = {}      # (key, timestamp) -> (fields, namedtuple)
+
+    def _layout(self, key, timestamp):
+        if (key, timestamp) not in self._layouts:
+            fields, tplname = layout(key)
+            names = [f[0] for f in fields] + (["time"] if timestamp else [])
+            self._layouts[(key, timestamp)] = (fields, namedtuple(tplname, names))
+        return self._layouts[(key, timestamp)]
+
+    def feed(self, data):
+        # Add received bytes and return list of records of completed batches
+        self._buf += data
+        res = []
+        while self._buf:
+            try: length, pos = read_varint(self._buf, 0)
+            except IndexError: break
+            if len(self._buf) < pos + length: break
+            body = bytes(self._buf[pos:pos + length])
+            del self._buf[:pos + length]
+            # A malformed batch is skipped, records of the other batches are returned
+            try: res += self.decode(body)
+            except ValueError: self.dropped += 1
+        return res
+
+    def decode(self, body):
+        # Decode a batch body (without length), raises ValueError if malformed
+        try:
+            return self._decode(body)
+        except (IndexError, struct.error) as e:
+            raise ValueError("Broken batch.") from e
+
+    def _decode(self, body):
+        key, flags = struct.unpack_from("<HB", body)
+        count, pos = read_varint(body, 3)
+        timestamp = bool(flags & FLAG_TIME)
+        fields, nmd = self._layout(key, timestamp)
+
+        columns = []
+        for fld in fields:
+            column, pos = self._decode_column(body, pos, count, fld[2] == "UInt8")
+            if not self.raw and fld[3] != 1: column = [Decimal(v) / fld[3] for v in column]
+            columns.append(column)
+        if timestamp:
+            column, pos = self._decode_column(body, pos, count, False)
+            columns.append([v / 1000 for v in column])
+        return [nmd(*values) for values in zip(*columns)]
+
+    def _decode_column(self, buf, pos, count, wrap8):
+        column = []
+        prev = 0
+        mode = buf[pos]
+        pos += 1
+        if mode == MODE_RUN:
+            runs, pos = read_varint(buf, pos)
+            for _ in range(runs):
+                d, pos = read_varint(buf, pos)
+                n, pos = read_varint(buf, pos)
+                d = unzigzag(d)
+                for _ in range(n):
+                    prev += d
+                    if wrap8: prev &= 0xff
+                    column.append(prev)
+        elif mode == MODE_DELTA:
+            for _ in range(count):
+                n, pos = read_varint(buf, pos)
+                prev += unzigzag(n)
+                if wrap8: prev &= 0xff
+                column.append(prev)
+        else:
+            raise ValueError(f"Unknown column mode: {mode}")
+        if len(column) != count: raise ValueError("Broken batch.")
+        return column, pos
@@ -0,0 +1,180 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.config
+"""
+Cached device configuration with coalesced and verified writes.
+
+Settings are read once and cached. Changes are staged, merged per address
+and written with one command per address, then verified by one read-back.
+provision() applies the same settings to many sensors concurrently.
+
+Example::
+
+    from omron_2jcie_bu01 import Omron2JCIE_BU01
+    from omron_2jcie_bu01.config import DeviceConfig, provision
+
+    sensor = Omron2JCIE_BU01.serial("/dev/ttyUSB0")
+    conf = DeviceConfig(sensor)
+    print(conf.get("mode"))
+    conf.set(rule=0x06, red=0, green=255, blue=200, mode=0x03)
+    report = conf.commit()
+    print(report.changed)   # {"rule": (1, 6), ...}
+
+    sensors = {port: Omron2JCIE_BU01.serial(port) for port in ports}
+    for port, report in provision(sensors, mode=0x01, interval=0x00a0).items():
+        print(port, report)
+"""
+import asyncio
+import struct
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from . import DataParser
+
+# Result of commit()
+# - changed  -- {field: (old, new)}
+# - verified -- True if read-back matches, None if not verified
+# - error    -- exception raised, None if succeeded
+ConfigReport = namedtuple("config_report", ["changed", "verified", "error"])
+
+class DeviceConfig(object):
+    # Cached settings of a device
+    # - sensor    -- Omron2JCIE_BU01_Serial or Omron2JCIE_BU01_BLE
+    # - addresses -- addresses of settings to be cached
+    ADDRESSES = (0x5111, 0x5115)
+
+    def __init__(self, sensor, addresses=ADDRESSES):
+        self.sensor = sensor
+        self.addresses = tuple(addresses)
+        self._cache = {}        # address -> parsed setting
+        self._pending = {}      # address -> {field: value}
+
+        # Field name -> address
+        self._address_of = {}
+        for address in self.addresses:
+            for fld in DataParser.FIELDS[address]:
+                self._address_of[fld[0]] = address
+
+    def load(self):
+        # Read all settings and cache them
+        for address in self.addresses:
+            self._cache[address] = self.sensor.get(address)
+        return self
+
+    def setting(self, address):
+        # Cached setting of address (read if not cached)
+        if address not in self._cache: self._cache[address] = self.sensor.get(address)
+        return self._cache[address]
+
+    def get(self, field):
+        # Cached value of the field, staged value is not reflected
+        return getattr(self.setting(self._address_of[field]), field)
+
+    def set(self, **kw):
+        # Stage changes, e.g. set(rule=0x06, mode=0x03)
+        for field, value in kw.items():
+            if field not in self._address_of: raise KeyError(f"Unknown setting: {field}")
+            self._pending.setdefault(self._address_of[field], {})[field] = value
+        return self
+
+    def invalidate(self):
+        # Discard cached settings
+        self._cache.clear()
+
+    def _values(self, address, tpl):
+        # Raw values of the setting fields (receive time fields are excluded)
+        return [int(getattr(tpl, f[0]) * f[3]) for f in DataParser.FIELDS[address]]
+
+    def _pack(self, address, tpl):
+        fields = DataParser.FIELDS[address]
+        return struct.pack(DataParser.generate_struct_format(fields), *self._values(address, tpl))
+
+    def commit(self, verify=True):
+        # Write staged changes, one command per changed address
+        # Returns ConfigReport
+        # If a write fails, changes not written yet are staged again.
+        changed, written = {}, {}
+        pending, self._pending = self._pending, {}
+        try:
+            for address, values in pending.items():
+                cur = self.setting(address)
+                new = cur._replace(**values)
+                if new == cur: continue
+                for field in values:
+                    if getattr(cur, field) != getattr(new, field):
+                        changed[field] = (getattr(cur, field), getattr(new, field))
+                self.sensor.get(address, self._pack(address, new))
+                written[address] = new
+        except Exception:
+            for key, values in pending.items():
+                if key in written: continue
+                # Changes staged meanwhile take precedence
+                self._pending[key] = dict(values, **self._pending.get(key, {}))
+            self._cache.update(written)
+            self._cache.pop(address, None)  # Setting of the failed address is unknown
+            raise
+
+        verified = None
+        if verify and written:
+            verified = True
+            for address, expected in written.items():
+                self._cache[address] = self.sensor.get(address)
+                if self._values(address, self._cache[address]) != self._values(address, expected):
+                    verified = False
+        else:
+            self._cache.update(written)
+        return ConfigReport(changed, verified, None)
+
+def provision(sensors, workers=8, verify=True, **settings):
+    # Apply settings to many sensors concurrently
+    # - sensors -- dict of {key: sensor} or list of sensors
+    # Returns dict of {key: ConfigReport}
+    #
+    # BLE sensors share the event loop of the thread which created them, and
+    # the loop cannot run in several threads at once. While configured, such a
+    # sensor runs on a new loop of the worker, and it is disconnected and moved
+    # back to the shared loop afterwards. Connected BLE sensors are disconnected
+    # on the shared loop first.
+    if not isinstance(sensors, dict): sensors = dict(enumerate(sensors))
+
+    def _commit(sensor):
+        try:
+            return DeviceConfig(sensor).set(**settings).commit(verify)
+        except Exception as e:
+            return ConfigReport({}, None, e)
+
+    def _configure(key):
+        sensor = sensors[key]
+        if not hasattr(sensor, "use_loop"): return _commit(sensor)
+
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            shared = sensor.use_loop(loop)
+        except Exception as e:
+            asyncio.set_event_loop(None)
+            loop.close()
+            return ConfigReport({}, None, e)
+        try:
+            return _commit(sensor)
+        finally:
+            try:
+                if sensor.is_connected(): sensor.disconnect()
+                sensor.use_loop(shared)
+                loop.close()
+            except Exception as e:
+                # The sensor is left on the loop of the worker
+                traceback.print_exc()
+            asyncio.set_event_loop(None)
+
+    reports = {}
+    for key, sensor in sensors.items():
+        if not hasattr(sensor, "use_loop"): continue
+        try:
+            if sensor.is_connected(): sensor.disconnect()
+        except Exception as e:
+            reports[key] = ConfigReport({}, None, e)
+
+    keys = [key for key in sensors if key not in reports]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        reports.update(zip(keys, executor.map(_configure, keys)))
+    return {key: reports[key] for key in sensors}
@@ -0,0 +1,104 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.deadband
+"""
+Change-driven emission filter (deadband) for sensing records.
+
+A record passes the filter only when a field has changed meaningfully since
+the last passed record, or when nothing has passed for the heartbeat period.
+The filter can be applied to poll(), scan() and start_notify().
+
+Example::
+
+    from omron_2jcie_bu01 import Omron2JCIE_BU01
+    from omron_2jcie_bu01.deadband import DeadbandFilter
+
+    # +-0.1 degC temperature, +-10 ppm eCO2, +-1% pressure, at least every 5 minutes
+    db = DeadbandFilter(
+        absolute={"temperature": 0.1, "eCO2": 10},
+        relative={"pressure": 0.01},
+        heartbeat=300)
+
+    sensor = Omron2JCIE_BU01.serial("/dev/ttyUSB0")
+    for tpl in sensor.poll(0x5021, interval=1, deadband=db):
+        print(tpl)
+
+    sensor = Omron2JCIE_BU01.ble("AA:BB:CC:DD:EE:FF")
+    sensor.scan(print, scantime=60, deadband=db)
+    sensor.start_notify(0x5012, on_notify, deadband=db)
+"""
+import time
+from decimal import Decimal
+
+class DeadbandFilter(object):
+    # Per-field deadband filter
+    # - absolute  -- {field: delta}; passes when |value - last| >= delta
+    # - relative  -- {field: ratio}; passes when |value - last| >= |last| * ratio
+    # - heartbeat -- maximum silence (seconds); passes when exceeded
+    #
+    # Values are compared with the last passed record of the same key, so that
+    # slow drifts are not hidden. If neither absolute nor relative is given,
+    # any change of fields other than EXCLUDE passes.
+    # Records are distinguished by key (e.g. device and characteristic).
+    EXCLUDE = ("type", "seq", "mono", "time")
+
+    def __init__(self, absolute=None, relative=None, heartbeat=None):
+        # Thresholds are held as Decimal to be compared exactly with parsed values
+        self.absolute = {k: Decimal(str(v)) for k, v in (absolute or {}).items()}
+        self.relative = {k: Decimal(str(v)) for k, v in (relative or {}).items()}
+        self.heartbeat = heartbeat
+        self.passed = 0
+        self.suppressed = 0
+        self._last = {}     # key -> (time, record)
+
+    def _changed(self, tpl, last):
+        if not self.absolute and not self.relative:
+            return any(getattr(tpl, f) != getattr(last, f)
+                for f in tpl._fields if f not in self.EXCLUDE)
+
+        for name, delta in self.absolute.items():
+            cur, prev = getattr(tpl, name, None), getattr(last, name, None)
+            if cur is None or prev is None: continue
+            if abs(cur - prev) >= delta: return True
+
+        for name, ratio in self.relative.items():
+            cur, prev = getattr(tpl, name, None), getattr(last, name, None)
+            if cur is None or prev is None: continue
+            if abs(cur - prev) >= abs(prev) * ratio: return True
+        return False
+
+    def check(self, tpl, key=None, t=None):
+        # Returns True if the record should be emitted
+        if t is None: t = time.monotonic()
+        last = self._last.get(key)
+        if (last is None
+                or last[1]._fields != tpl._fields
+                or (self.heartbeat is not None and t - last[0] >= self.heartbeat)
+                or self._changed(tpl, last[1])):
+            self._last[key] = (t, tpl)
+            self.passed += 1
+            return True
+        self.suppressed += 1
+        return False
+
+    def reset(self, key=None):
+        # Forget the last records (all keys if key is None)
+        if key is None: self._last.clear()
+        else: self._last.pop(key, None)
+
+    def filter(self, iterable, key=None):
+        # Generator which yields records passing the filter
+        for tpl in iterable:
+            if self.check(tpl, key): yield tpl
+
+    def wrap(self, callback, key=None):
+        # Wrap callback(tpl) (e.g. for scan())
+        def _callback(tpl):
+            if self.check(tpl, key): callback(tpl)
+        return _callback
+
+    def wrap_notify(self, callback, key=None):
+        # Wrap callback(sender, tpl) (e.g. for start_notify())
+        # Records are distinguished by sender in addition to key.
+        def _callback(sender, tpl):
+            if self.check(tpl, (key, sender)): callback(sender, tpl)
+        return _callback
@@ -0,0 +1,110 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.discovery
+"""
+Fast discovery of 2JCIE-BU01 devices with a persistent address cache.
+
+discover() returns as soon as the requested devices (by count or address)
+are detected, instead of waiting for the whole scan time. All devices named
+"Rbt" found in a scan are recorded in a local cache with the last seen RSSI,
+so that later startups can skip scanning or limit it to known addresses.
+
+Example::
+
+    from omron_2jcie_bu01 import Omron2JCIE_BU01
+    from omron_2jcie_bu01.discovery import discover, DeviceCache
+
+    # All sensors in one pass (strongest first)
+    for dev in discover(timeout=5):
+        print(dev.address, dev.rssi)
+
+    # Return as soon as 2 sensors are found
+    devices = discover(count=2)
+
+    # Use known addresses without scanning
+    sensors = [Omron2JCIE_BU01.ble(addr) for addr in DeviceCache().addresses()]
+"""
+import asyncio
+import json
+import os
+import time
+from collections import namedtuple
+
+# Discovered device
+DeviceEntry = namedtuple("device_entry", ["address", "rssi", "last_seen"])
+
+class DeviceCache(object):
+    # Persistent cache of device addresses (JSON file)
+    # - path -- path of the cache file (default: ~/.cache/omron_2jcie_bu01/devices.json)
+    PATH = os.path.join("~", ".cache", "omron_2jcie_bu01", "devices.json")
+
+    def __init__(self, path=None):
+        self.path = os.path.expanduser(path or self.PATH)
+        self.devices = {}       # address -> DeviceEntry
+        try:
+            with open(self.path) as f:
+                for addr, ent in json.load(f).items():
+                    self.devices[addr] = DeviceEntry(addr, ent.get("rssi"), ent.get("last_seen", 0))
+        except (OSError, ValueError):
+            pass
+
+    def update(self, entries):
+        # Record entries and save the cache
+        for ent in entries: self.devices[ent.address.upper()] = ent._replace(address=ent.address.upper())
+        self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({a: {"rssi": e.rssi, "last_seen": e.last_seen} for a, e in self.devices.items()}, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def entries(self, max_age=None):
+        # Cached entries, most recently seen first
+        # - max_age -- exclude entries not seen for seconds
+        now = time.time()
+        res = [e for e in self.devices.values() if max_age is None or now - e.last_seen <= max_age]
+        return sorted(res, key=lambda e: e.last_seen, reverse=True)
+
+    def addresses(self, max_age=None):
+        return [e.address for e in self.entries(max_age)]
+
+def discover(count=None, addresses=None, timeout=10.0, name="Rbt", cache=True, loop=None, known=None):
+    # Scan devices and return list of DeviceEntry (strongest RSSI first)
+    # - count     -- return as soon as count devices are found
+    #                (default: number of addresses, or None for scanning until timeout)
+    # - addresses -- only these addresses are targets
+    # - known     -- addresses which are targets even if the name is not received yet
+    # - timeout   -- maximum scan time (seconds)
+    # - name      -- device name
+    # - cache     -- True for the default DeviceCache, DeviceCache object or None
+    from bleak import BleakScanner
+
+    targets = set(a.upper() for a in addresses) if addresses else None
+    known = set(a.upper() for a in known or ()) | (targets or set())
+    if count is None and targets: count = len(targets)
+    loop = loop or asyncio.get_event_loop()
+
+    async def _discover():
+        found = {}
+        deadline = loop.time() + timeout
+        async with BleakScanner(loop=loop) as scanner:
+            while True:
+                devices = getattr(scanner, "discovered_devices", None)
+                if devices is None: devices = await scanner.get_discovered_devices()
+                now = time.time()
+                for dev in devices:
+                    addr = dev.address.upper()
+                    if dev.name != name and addr not in known: continue
+                    found[addr] = DeviceEntry(addr, getattr(dev, "rssi", None), now)
+
+                matched = [e for a, e in found.items() if targets is None or a in targets]
+                if count is not None and len(matched) >= count: break
+                if loop.time() >= deadline: break
+                await asyncio.sleep(0.1)
+        return found, matched
+
+    found, matched = loop.run_until_complete(_discover())
+    if cache is True: cache = DeviceCache()
+    if cache is not None and found: cache.update(found.values())
+    return sorted(matched, key=lambda e: -e.rssi if e.rssi is not None else float("inf"))
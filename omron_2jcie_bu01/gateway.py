@@ -0,0 +1,342 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.gateway
+"""
+Sensor gateway serving cached latest readings to local clients.
+
+The gateway owns the sensors, polls them in background threads and keeps the
+latest data per sensor and address in memory. Clients get the cached data
+over a Unix socket (or local TCP) or HTTP, without touching the device, and
+can subscribe to a stream of updates.
+
+Protocol of the socket server (one line per request/response, JSON)::
+
+    GET <sensor> <address>       -> {"sensor": ..., "address": ..., "data": {...}}
+    LIST                         -> ["<sensor> <address>", ...]
+    SUBSCRIBE [<sensor> [<address>]] -> a line for each update
+
+HTTP server::
+
+    GET /latest                  -> all latest data
+    GET /latest/<sensor>/<address>
+
+Example::
+
+    from omron_2jcie_bu01 import Omron2JCIE_BU01
+    from omron_2jcie_bu01.gateway import Gateway, GatewayClient
+
+    gw = Gateway()
+    gw.add("usb0", Omron2JCIE_BU01.serial("/dev/ttyUSB0"), [0x5021], interval=1)
+    gw.serve_unix("/tmp/bu01.sock")
+    gw.serve_http(8021)
+    gw.start()
+
+    # In other processes
+    client = GatewayClient("/tmp/bu01.sock")
+    print(client.get("usb0", 0x5021))
+    for update in client.subscribe("usb0"):
+        print(update)
+
+    # Command line
+    $ python3 -m omron_2jcie_bu01.gateway --serial usb0=/dev/ttyUSB0 --unix /tmp/bu01.sock
+"""
+import json
+import os
+import queue
+import select
+import socket
+import socketserver
+import threading
+import time
+import traceback
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def _default(obj):
+    # JSON encoder for parsed data
+    if isinstance(obj, Decimal): return float(obj)
+    if isinstance(obj, bytes): return obj.hex()
+    raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+
+def encode(sensor, address, tpl, received):
+    # Encode an update as a JSON line
+    data = tpl._asdict() if hasattr(tpl, "_asdict") else tpl
+    obj = {"sensor": sensor, "address": f"0x{address:04x}", "received": received, "data": data}
+    return (json.dumps(obj, default=_default) + "\n").encode("utf8")
+
+class Gateway(object):
+    # Owns sensors and serves the latest data
+    # - queue_size     -- maximum updates queued per subscriber, older ones are dropped
+    # - check_interval -- seconds between checks of idle subscribers (disconnected or stopped)
+    def __init__(self, queue_size=256, check_interval=1.0):
+        self.queue_size = queue_size
+        self.check_interval = check_interval
+        self.latest = {}            # (sensor, address) -> encoded JSON line
+        self._pollers = []
+        self._servers = []
+        self._started = []          # Servers running serve_forever()
+        self._subscribers = set()
+        self._loop_locks = {}       # id(event loop) -> lock
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def add(self, name, sensor, addresses=(0x5021,), interval=1.0, deadband=None):
+        # Register a sensor to be polled every interval seconds
+        # The sensor is accessed only from the polling thread. BLE sensors
+        # sharing an event loop are polled one at a time.
+        loop = getattr(sensor, "loop", None)
+        lock = self._loop_locks.setdefault(id(loop), threading.Lock()) if loop else threading.Lock()
+
+        def _poll():
+            while not self._stop.is_set():
+                started = time.monotonic()
+                for address in addresses:
+                    try:
+                        with lock: tpl = sensor.get(address)
+                    except Exception as e:
+                        traceback.print_exc()
+                        continue
+                    if deadband is None or deadband.check(tpl, (name, address)):
+                        self.update(name, address, tpl)
+                self._stop.wait(max(0, interval - (time.monotonic() - started)))
+        self._pollers.append(threading.Thread(target=_poll, name=f"gateway-{name}", daemon=True))
+
+    def update(self, name, address, tpl, received=None):
+        # Store the latest data and deliver it to subscribers
+        # Can be used as a sink of scan() and start_notify() callbacks as well.
+        line = encode(name, address, tpl, time.time() if received is None else received)
+        with self._lock:
+            self.latest[(name, address)] = line
+            subscribers = list(self._subscribers)
+        for sub in subscribers: sub.put(name, address, line)
+
+    def get(self, name, address):
+        # Cached JSON line of the latest data (None if not yet received)
+        return self.latest.get((name, address))
+
+    def subscribe(self, name=None, address=None):
+        # Subscription which receives updates of the sensor/address (None for all)
+        sub = Subscription(self, name, address, self.queue_size)
+        with self._lock: self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock: self._subscribers.discard(sub)
+
+    def serve_unix(self, path):
+        # Serve the line protocol on a Unix domain socket
+        if os.path.exists(path): os.unlink(path)
+        server = socketserver.ThreadingUnixStreamServer(path, self._handler())
+        self._add_server(server)
+        return server
+
+    def serve_tcp(self, port, host="127.0.0.1"):
+        # Serve the line protocol on a local TCP port
+        server = socketserver.ThreadingTCPServer((host, port), self._handler())
+        self._add_server(server)
+        return server
+
+    def serve_http(self, port, host="127.0.0.1"):
+        # Serve the latest data over HTTP
+        gateway = self
+
+        class _HTTPHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parts = self.path.strip("/").split("/")
+                if parts == ["latest"]:
+                    body = b"[" + b",".join(line.rstrip() for line in list(gateway.latest.values())) + b"]"
+                elif len(parts) == 3 and parts[0] == "latest":
+                    try: body = gateway.get(parts[1], int(parts[2], 0))
+                    except ValueError: body = None
+                else:
+                    body = None
+                if body is None: return self.send_error(404)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args): pass
+
+        server = ThreadingHTTPServer((host, port), _HTTPHandler)
+        self._add_server(server)
+        return server
+
+    def _add_server(self, server):
+        server.daemon_threads = True
+        self._servers.append(server)
+
+    def _handler(self):
+        gateway = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    args = line.decode("utf8").split()
+                    if not args: continue
+                    cmd = args[0].upper()
+                    if cmd == "GET" and len(args) == 3:
+                        try: res = gateway.get(args[1], int(args[2], 0))
+                        except ValueError: res = None
+                        self.wfile.write(res or b"null\n")
+                    elif cmd == "LIST":
+                        keys = [f"{n} 0x{a:04x}" for n, a in list(gateway.latest)]
+                        self.wfile.write((json.dumps(keys) + "\n").encode("utf8"))
+                    elif cmd == "SUBSCRIBE":
+                        name = args[1] if len(args) > 1 else None
+                        address = int(args[2], 0) if len(args) > 2 else None
+                        sub = gateway.subscribe(name, address)
+                        try:
+                            while not gateway._stop.is_set():
+                                try: update = sub.get(gateway.check_interval)
+                                except queue.Empty:
+                                    if self._disconnected(): break
+                                    continue
+                                if update is None: break
+                                self.wfile.write(update)
+                        except OSError: pass
+                        finally: gateway.unsubscribe(sub)
+                        return
+                    else:
+                        self.wfile.write(b'{"error": "invalid request"}\n')
+
+            def _disconnected(self):
+                # True if the client has closed the connection
+                try:
+                    readable, _, _ = select.select([self.connection], [], [], 0)
+                    return bool(readable) and self.connection.recv(1, socket.MSG_PEEK) == b""
+                except OSError:
+                    return True
+
+        return _Handler
+
+    def start(self):
+        # Start polling and serving in background threads
+        for th in self._pollers: th.start()
+        for server in self._servers:
+            if server in self._started: continue
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._started.append(server)
+
+    def stop(self):
+        self._stop.set()
+        with self._lock: subscribers = list(self._subscribers)
+        for sub in subscribers: sub.close()
+        # shutdown() waits for serve_forever(), so it is called only for started servers
+        for server in self._started: server.shutdown()
+        for server in self._servers: server.server_close()
+        self._started.clear()
+
+    def run_forever(self):
+        # start() and block until interrupted
+        self.start()
+        try:
+            while not self._stop.wait(1): pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+class Subscription(object):
+    # Queue of updates for a subscriber
+    # If the subscriber is slow, the oldest updates are dropped (counted in dropped).
+    def __init__(self, gateway, name, address, size):
+        self.gateway = gateway
+        self.name = name
+        self.address = address
+        self.dropped = 0
+        self._queue = queue.Queue(size)
+
+    def put(self, name, address, line):
+        if self.name is not None and name != self.name: return
+        if self.address is not None and address != self.address: return
+        self._put(line)
+
+    def _put(self, item):
+        # Never blocks, drops the oldest update if full
+        while True:
+            try: return self._queue.put_nowait(item)
+            except queue.Full:
+                try: self._queue.get_nowait()
+                except queue.Empty: pass
+                self.dropped += 1
+
+    def close(self):
+        # End the iteration after queued updates
+        self._put(None)
+
+    def get(self, timeout=None):
+        # Next update, None if closed. Raises queue.Empty on timeout.
+        return self._queue.get(timeout=timeout)
+
+    def __iter__(self):
+        # Ends when closed or the gateway is stopped
+        while True:
+            try: line = self.get(self.gateway.check_interval)
+            except queue.Empty:
+                if self.gateway._stop.is_set(): return
+                continue
+            if line is None: return
+            yield line
+
+class GatewayClient(object):
+    # Client for the gateway line protocol
+    # - path -- Unix socket path, or (host, port) for TCP
+    def __init__(self, path):
+        if isinstance(path, tuple):
+            self.sock = socket.create_connection(path)
+        else:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(path)
+        self.rfile = self.sock.makefile("rb")
+
+    def _request(self, line):
+        self.sock.sendall((line + "\n").encode("utf8"))
+        return json.loads(self.rfile.readline())
+
+    def get(self, name, address):
+        # Latest data of the sensor and address (None if not yet received)
+        return self._request(f"GET {name} 0x{address:04x}")
+
+    def list(self):
+        return self._request("LIST")
+
+    def subscribe(self, name=None, address=None):
+        # Generator of updates, the connection is dedicated to the subscription
+        line = "SUBSCRIBE"
+        if name is not None: line += f" {name}"
+        if address is not None: line += f" 0x{address:04x}"
+        self.sock.sendall((line + "\n").encode("utf8"))
+        for line in self.rfile: yield json.loads(line)
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+def main():
+    import argparse
+    from . import Omron2JCIE_BU01
+
+    ap = argparse.ArgumentParser(description="Gateway for OMRON 2JCIE-BU01")
+    ap.add_argument("--serial", action="append", default=[], metavar="NAME=PORT")
+    ap.add_argument("--ble", action="append", default=[], metavar="NAME=ADDRESS")
+    ap.add_argument("--interval", type=float, default=1.0)
+    ap.add_argument("--unix", metavar="PATH")
+    ap.add_argument("--tcp", type=int, metavar="PORT")
+    ap.add_argument("--http", type=int, metavar="PORT")
+    args = ap.parse_args()
+
+    gw = Gateway()
+    for spec in args.serial:
+        name, port = spec.split("=", 1)
+        gw.add(name, Omron2JCIE_BU01.serial(port), [0x5021], args.interval)
+    for spec in args.ble:
+        name, address = spec.split("=", 1)
+        gw.add(name, Omron2JCIE_BU01.ble(address), [0x5012, 0x5013], args.interval)
+    if args.unix: gw.serve_unix(args.unix)
+    if args.tcp: gw.serve_tcp(args.tcp)
+    if args.http: gw.serve_http(args.http)
+    gw.run_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.poller
+"""
+Adaptive polling synchronized with the measurement cycle of the device.
+
+The device returns the same sequence number until the next measurement.
+AdaptivePoller peeks at the sequence number of the raw response and skips
+decoding of duplicates. It learns the update period of the device from the
+sequence numbers and schedules the next poll just after the expected update,
+so that duplicates are nearly zero with minimum latency.
+
+Example::
+
+    from omron_2jcie_bu01 import Omron2JCIE_BU01
+    from omron_2jcie_bu01.poller import AdaptivePoller
+
+    sensor = Omron2JCIE_BU01.serial("/dev/ttyUSB0")
+    poller = AdaptivePoller(sensor, 0x5021)
+    for tpl in poller:
+        print(tpl.seq, poller.period)
+
+    # Same as above
+    for tpl in sensor.poll(0x5021, adaptive=True):
+        print(tpl)
+"""
+import time
+
+class AdaptivePoller(object):
+    # Poll address of the sensor at the update period of the device
+    # - interval     -- initial guess of the update period (seconds)
+    # - min_interval -- minimum interval between polls (seconds)
+    # - guard        -- margin around the expected update (ratio of period)
+    # - resync       -- probe the update slightly early every resync cycles
+    #                   to keep the phase (the probe is a cheap duplicate)
+    # - smoothing    -- weight of a new observation for the period estimate
+    # - deadband     -- DeadbandFilter for the parsed data
+    #
+    # An update is located precisely when it is observed right after a
+    # duplicate; such observations are used to learn the period and the phase.
+    SEQ_OFFSET = 2      # Sequence number follows address(2 bytes)
+
+    def __init__(self, sensor, address=0x5021, interval=1.0, min_interval=0.02,
+            guard=0.05, resync=10, smoothing=0.2, deadband=None):
+        self.sensor = sensor
+        self.address = address
+        self.interval = interval
+        self.min_interval = min_interval
+        self.guard = guard
+        self.resync = resync
+        self.smoothing = smoothing
+        self.deadband = deadband
+        self.period = None          # Learned update period
+        self.polls = 0
+        self.duplicates = 0
+        self._last_seq = None
+        self._last_poll = None      # Time of the last poll
+        self._last_dup = False      # The last poll was a duplicate
+        self._phase = None          # Estimated time of the last update
+        self._anchor = None         # (time, seq) of the last precisely located update
+        self._cycles = 0
+        self._next_poll = None      # Time of the next poll scheduled by iterate()
+
+    def _retry_interval(self):
+        # Interval to poll again after a duplicate
+        period = self.period or self.interval
+        return max(self.min_interval, period * self.guard)
+
+    def _locate(self, seq, now):
+        # Estimate the time of the update observed at now
+        steps = (seq - self._last_seq) % 256 if self._last_seq is not None else 1
+        if self._last_dup:
+            # The update happened between the last poll and now
+            changed = (self._last_poll + now) / 2
+            if self._anchor:
+                t, s = self._anchor
+                n = (seq - s) % 256
+                if n:
+                    observed = (changed - t) / n
+                    if self.period is None: self.period = observed
+                    else: self.period += self.smoothing * (observed - self.period)
+            self._anchor = (changed, seq)
+            return changed
+        if self.period is not None and self._phase is not None:
+            # Predicted by the period
+            return min(now, self._phase + steps * self.period)
+        return now
+
+    def poll_once(self):
+        # Poll once and returns tuple(parsed data, seconds to wait for the next poll)
+        # The parsed data is None if the data is not updated.
+        data = self.sensor.get_raw(self.address)
+        now = time.monotonic()
+        wall = time.time()
+        self.polls += 1
+        seq = data[self.SEQ_OFFSET]
+
+        if seq == self._last_seq:
+            # Not updated yet, skip decoding
+            self.duplicates += 1
+            self._last_poll, self._last_dup = now, True
+            return None, self._retry_interval()
+
+        self._phase = self._locate(seq, now)
+        self._last_seq = seq
+        self._last_poll, self._last_dup = now, False
+        tpl = self.sensor._track(self.address, self.sensor.parser.parse(data, received=(now, wall)))
+
+        if self.period is None: return tpl, self._retry_interval()
+        # Phase lock: poll just after the next expected update,
+        # or just before it for resynchronization
+        self._cycles += 1
+        if self._cycles >= self.resync:
+            self._cycles = 0
+            target = self._phase + self.period * (1 - self.guard)
+        else:
+            target = self._phase + self.period * (1 + self.guard)
+        return tpl, max(self.min_interval, target - time.monotonic())
+
+    def __iter__(self):
+        return self.iterate()
+
+    def iterate(self, count=None, timeout=None):
+        # Generator of updated data
+        # - count   -- number of updated data, None for infinite
+        # - timeout -- stop after seconds, None for infinite
+        started = time.monotonic()
+        n = 0
+        # Resume the schedule of the previous iteration
+        if self._next_poll is not None:
+            self.sensor.sleep(max(0, self._next_poll - started))
+        while count is None or n < count:
+            if timeout is not None and time.monotonic() - started >= timeout: return
+            tpl, wait = self.poll_once()
+            self._next_poll = time.monotonic() + wait
+            if tpl is not None:
+                n += 1
+                if self.deadband is None or self.deadband.check(tpl, (id(self.sensor), self.address)):
+                    yield tpl
+                if count is not None and n >= count: return
+            self.sensor.sleep(max(0, self._next_poll - time.monotonic()))
@@ -0,0 +1,230 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.pool
+"""
+BLE connection pool for more sensors than the adapter can connect at once.
+
+The pool keeps at most max_connections links. Recently used connections are
+kept warm, the least recently used one is disconnected when a new link is
+needed, and idle links are disconnected after idle_timeout by a timer. Reads
+from threads are served in round-robin order across sensors, and read latency
+is recorded per sensor.
+
+Example::
+
+    from omron_2jcie_bu01.pool import BLEConnectionPool
+
+    pool = BLEConnectionPool(max_connections=3)
+    for addr in addresses: pool.add(addr)
+    for addr, tpl in pool.read_all(0x5012).items():
+        print(addr, tpl)
+
+    sensor = pool.sensor("AA:BB:CC:DD:EE:FF")   # get() goes through the pool
+    print(sensor.latest_sensing_data(), sensor.led())
+    print(pool.latency())
+"""
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque, namedtuple
+from . import Omron2JCIE_BU01
+
+# Read latency of a sensor (seconds)
+LatencyStats = namedtuple("latency_stats", ["count", "mean", "min", "max", "last", "connects"])
+
+class BLEConnectionPool(object):
+    # Time-multiplex BLE connections
+    # - max_connections -- maximum number of simultaneous connections
+    # - idle_timeout    -- disconnect links not used for seconds, None to keep them
+    # - factory         -- function to create a sensor from address
+    #                      (default: Omron2JCIE_BU01.ble)
+    def __init__(self, max_connections=3, idle_timeout=30.0, factory=None):
+        if max_connections < 1: raise ValueError("max_connections must be 1 or more.")
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.factory = factory or Omron2JCIE_BU01.ble
+        self.sensors = OrderedDict()    # address -> sensor
+        self._connected = OrderedDict() # address -> last used, least recently used first
+        self._latency = {}              # address -> [count, total, min, max, last, connects]
+
+        # Round-robin scheduling of requests across sensors
+        self._cond = threading.Condition()
+        self._waiting = {}              # address -> deque of tickets
+        self._order = deque()           # addresses with waiting requests
+        self._busy = False
+        self._timer = None              # threading.Timer for evict_idle()
+
+    def add(self, address, sensor=None):
+        # Register a sensor (created by factory if sensor is None)
+        if address not in self.sensors:
+            self.sensors[address] = sensor or self.factory(address)
+            self._latency[address] = [0, 0.0, None, None, None, 0]
+        return self.sensors[address]
+
+    def sensor(self, address):
+        # Sensor object whose get() goes through the pool
+        self.add(address)
+        return PooledSensor(self, address)
+
+    def _enter(self, address):
+        # Wait for the turn of the request
+        # address None is for maintenance of the pool (evict_idle(), close())
+        ticket = object()
+        with self._cond:
+            self._waiting.setdefault(address, deque()).append(ticket)
+            if address not in self._order: self._order.append(address)
+            while self._busy or self._waiting[self._order[0]][0] is not ticket:
+                self._cond.wait()
+            self._busy = True
+            queue = self._waiting[address]
+            queue.popleft()
+            self._order.popleft()
+            if queue: self._order.append(address)   # Next request of the sensor waits for others
+            else: del self._waiting[address]
+
+    def _leave(self):
+        with self._cond:
+            self._busy = False
+            self._cond.notify_all()
+
+    def _disconnect(self, address):
+        self._connected.pop(address, None)
+        try: self.sensors[address].disconnect()
+        except Exception as e: traceback.print_exc()
+
+    def _acquire(self, address):
+        # Connect to the sensor, disconnecting the least recently used one if full
+        self._evict_idle(time.monotonic())
+        if address in self._connected: return self.sensors[address]
+        while len(self._connected) >= self.max_connections:
+            self._disconnect(next(iter(self._connected)))
+        self.sensors[address].connect()
+        self._latency[address][5] += 1
+        self._connected[address] = time.monotonic()
+        return self.sensors[address]
+
+    def get(self, address, chara, data=b"", name=None):
+        # get() of the sensor through the pool
+        return self._call(address, "get", chara, data, name)
+
+    def get_raw(self, address, chara):
+        # get_raw() of the sensor through the pool
+        return self._call(address, "get_raw", chara)
+
+    def _call(self, address, method, *args):
+        self.add(address)
+        self._enter(address)
+        try:
+            started = time.monotonic()
+            try:
+                res = getattr(self._acquire(address), method)(*args)
+            except Exception:
+                # The link may be broken
+                if address in self._connected: self._disconnect(address)
+                raise
+            now = time.monotonic()
+            self._connected[address] = now
+            self._connected.move_to_end(address)
+            self._record(address, now - started)
+            return res
+        finally:
+            self._schedule()
+            self._leave()
+
+    def _record(self, address, elapsed):
+        lat = self._latency[address]
+        lat[0] += 1
+        lat[1] += elapsed
+        lat[2] = elapsed if lat[2] is None else min(lat[2], elapsed)
+        lat[3] = elapsed if lat[3] is None else max(lat[3], elapsed)
+        lat[4] = elapsed
+
+    def read_all(self, chara):
+        # Read chara of all sensors, returns {address: data or exception}
+        res = {}
+        for address in list(self.sensors):
+            try: res[address] = self.get(address, chara)
+            except Exception as e: res[address] = e
+        return res
+
+    def evict_idle(self, now=None):
+        # Disconnect links idle for idle_timeout
+        # Called by the timer; waits for the request in progress
+        self._enter(None)
+        try:
+            self._evict_idle(now if now is not None else time.monotonic())
+            self._schedule()
+        finally:
+            self._leave()
+
+    def _evict_idle(self, now):
+        if self.idle_timeout is None: return
+        for address, used in list(self._connected.items()):
+            if now - used >= self.idle_timeout: self._disconnect(address)
+
+    def _schedule(self):
+        # Start the timer to evict the link which becomes idle first
+        # (called in the turn of a request)
+        if self.idle_timeout is None: return
+        with self._cond:
+            if self._timer is not None or not self._connected: return
+            wait = min(self._connected.values()) + self.idle_timeout - time.monotonic()
+            self._timer = threading.Timer(max(wait, 0), self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self):
+        with self._cond: self._timer = None
+        try: self.evict_idle()
+        except Exception as e: traceback.print_exc()
+
+    def connected(self):
+        # Connected addresses, least recently used first
+        return list(self._connected)
+
+    def latency(self, address=None):
+        # LatencyStats of the sensor, or {address: LatencyStats} if address is None
+        # (connection time is included in the latency)
+        if address is None: return {a: self.latency(a) for a in self.sensors}
+        count, total, lo, hi, last, connects = self._latency[address]
+        return LatencyStats(count, total / count if count else None, lo, hi, last, connects)
+
+    def close(self):
+        # Disconnect all
+        with self._cond:
+            if self._timer is not None: self._timer.cancel()
+            self._timer = None
+        self._enter(None)
+        try:
+            for address in list(self._connected): self._disconnect(address)
+        finally:
+            self._leave()
+
+class PooledSensor(Omron2JCIE_BU01):
+    # Sensor which reads through BLEConnectionPool
+    # parser and tracker are those of the pooled sensor, so that loss_stats()
+    # and poll(adaptive=True) work.
+    def __init__(self, pool, address):
+        self.pool = pool
+        self.address = address
+
+    @property
+    def parser(self):
+        return self.pool.sensors[self.address].parser
+
+    @property
+    def tracker(self):
+        return self.pool.sensors[self.address].tracker
+
+    def get(self, chara, data=b"", name=None):
+        return self.pool.get(self.address, chara, data, name)
+
+    def get_raw(self, chara):
+        return self.pool.get_raw(self.address, chara)
+
+    def latest_sensing_data(self):
+        # 0x5012: Latest sensing data
+        return self.get(0x5012)
+
+    def latest_calculation_data(self):
+        # 0x5013: Latest calculation data
+        return self.get(0x5013)
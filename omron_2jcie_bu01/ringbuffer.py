@@ -0,0 +1,248 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.ringbuffer
+"""
+Shared memory ring buffer for passing samples to local processes.
+
+A publisher process writes fixed-layout records derived from the field tables
+of DataParser into multiprocessing.shared_memory. Any number of reader
+processes get the records from the shared memory without pickling nor IPC,
+and detect overruns by sequence counters. read() unpacks each record into a
+namedtuple; view() returns a NumPy structured array on the shared memory
+itself, without copying. Requires Python 3.8+.
+
+Example::
+
+    # Publisher (owns the sensor)
+    from omron_2jcie_bu01 import Omron2JCIE_BU01
+    from omron_2jcie_bu01.ringbuffer import RingPublisher
+    sensor = Omron2JCIE_BU01.serial("/dev/ttyUSB0")
+    ring = RingPublisher("bu01", 0x5021, slots=4096)
+    for tpl in sensor.poll(0x5021, interval=1):
+        ring.publish(tpl)
+
+    # Readers (any number of processes)
+    from omron_2jcie_bu01.ringbuffer import RingReader
+    ring = RingReader("bu01")
+    while True:
+        for rec in ring.read(): print(rec.temperature)
+        time.sleep(1)
+
+    # Zero-copy (NumPy)
+    v = ring.view()
+    mean = v.array["temperature"].mean() / 100
+    if not ring.valid(v): mean = None   # Overwritten while processing
+"""
+import os
+import struct
+import time
+from collections import namedtuple
+from decimal import Decimal
+from multiprocessing import shared_memory
+from . import DataParser
+
+# Records returned by RingReader.view()
+# - position -- index of the first record
+# - array    -- NumPy structured array on the shared memory
+RingView = namedtuple("ring_view", ["position", "array"])
+
+# Names of shared memory created in this process
+_created = set()
+
+def _tracker_name(name):
+    # Name of shared memory as registered in resource tracker
+    # (SharedMemory prepends a slash on POSIX)
+    return "/" + name if os.name == "posix" else name
+
+class RingLayout(object):
+    # Layout of the shared memory
+    #
+    # Header: magic(4s) address(H) reserved(H) slots(L) slot size(L) head(Q)
+    #   head -- number of records written so far
+    # Slot:   sequence(Q) mono(d) time(d) fields...
+    #   sequence -- 2n+1 while writing n-th record, 2n+2 when completed
+    #   fields   -- raw integers in the same types as the device frame
+    HEADER = struct.Struct("<4sHHLLQ")
+    HEAD_OFFSET = 16
+    MAGIC = b"OMRB"
+    SLOT_HEADER = struct.Struct("<Qdd")
+
+    def __init__(self, address):
+        if address not in DataParser.FIELDS: raise ValueError(f"Unknown address: 0x{address:04x}")
+        self.address = address
+        self.fields = [f for f in DataParser.FIELDS[address] if f[0] != "_reserved"]
+        self.body = struct.Struct(DataParser.generate_struct_format(self.fields))
+        # Slot size is aligned to 8 bytes
+        size = self.SLOT_HEADER.size + self.body.size
+        self.slot_size = (size + 7) // 8 * 8
+        self.names = [f[0] for f in self.fields]
+        tplname = DataParser.TPLNAME.get(address, f"Address_0x{address:04x}")
+        self.tuple = namedtuple(tplname, self.names + ["mono", "time"])
+
+    def dtype(self):
+        # NumPy dtype of a slot: _slot (sequence of the slot), mono, time and raw fields
+        import numpy
+        types = {"B": "u1", "H": "<u2", "h": "<i2", "L": "<u4", "l": "<i4"}
+        names, formats, offsets = ["_slot", "mono", "time"], ["<u8", "<f8", "<f8"], [0, 8, 16]
+        fmt = "<"
+        for fld in self.fields:
+            offsets.append(self.SLOT_HEADER.size + struct.calcsize(fmt))
+            code = DataParser.TYPE[fld[2]]
+            fmt += code
+            names.append(fld[0])
+            formats.append(types[code])
+        return numpy.dtype({"names": names, "formats": formats, "offsets": offsets,
+                            "itemsize": self.slot_size})
+
+    def raw_values(self, tpl):
+        # Raw integers from parsed data
+        return [int(getattr(tpl, f[0]) * f[3]) for f in self.fields]
+
+    def scale(self, values):
+        # Scale raw integers in the same way as DataParser
+        return [Decimal(v) / f[3] if f[3] != 1 else v for v, f in zip(values, self.fields)]
+
+    def size(self, slots):
+        return self.HEADER.size + slots * self.slot_size
+
+class RingPublisher(object):
+    # Write records into a shared memory ring buffer
+    # - name    -- name of the shared memory (None for a generated name)
+    # - address -- address of the data, fields are taken from DataParser.FIELDS
+    # - slots   -- number of records in the ring
+    def __init__(self, name=None, address=0x5021, slots=4096):
+        self.layout = RingLayout(address)
+        self.slots = slots
+        self.shm = shared_memory.SharedMemory(name, create=True, size=self.layout.size(slots))
+        self.name = self.shm.name
+        _created.add(self.name)
+        self.head = 0
+        self.layout.HEADER.pack_into(self.shm.buf, 0,
+            RingLayout.MAGIC, address, 0, slots, self.layout.slot_size, 0)
+
+    def _write(self, values, mono, wall):
+        if mono is None: mono = time.monotonic()
+        if wall is None: wall = time.time()
+        buf = self.shm.buf
+        offset = RingLayout.HEADER.size + (self.head % self.slots) * self.layout.slot_size
+        RingLayout.SLOT_HEADER.pack_into(buf, offset, self.head * 2 + 1, mono, wall)
+        self.layout.body.pack_into(buf, offset + RingLayout.SLOT_HEADER.size, *values)
+        struct.pack_into("<Q", buf, offset, self.head * 2 + 2)
+        self.head += 1
+        struct.pack_into("<Q", buf, RingLayout.HEAD_OFFSET, self.head)
+
+    def publish(self, tpl, mono=None, wall=None):
+        # Write parsed data
+        # Receive time (mono, time) of the data is used if parsed with timestamp
+        if mono is None: mono = getattr(tpl, "mono", None)
+        if wall is None: wall = getattr(tpl, "time", None)
+        self._write(self.layout.raw_values(tpl), mono, wall)
+
+    def publish_frame(self, data, mono=None, wall=None):
+        # Write data body of a frame (address + payload) without parsing
+        # e.g. the return value of Omron2JCIE_BU01_Serial.read_response()
+        address = struct.unpack("<H", data[:2])[0]
+        if address != self.layout.address: raise ValueError(f"Address not match: 0x{address:04x}")
+        fmt = DataParser.generate_struct_format(DataParser.FIELDS[address])
+        self._write(struct.unpack(fmt, data[2:]), mono, wall)
+
+    def close(self, unlink=True):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+            _created.discard(self.name)
+
+class RingReader(object):
+    # Read records from a shared memory ring buffer
+    # - name   -- name of the shared memory
+    # - latest -- start from the latest record, False for the oldest one in the ring
+    #
+    # Overrun (records overwritten before read) is counted in lost.
+    def __init__(self, name, latest=True):
+        try:
+            self.shm = shared_memory.SharedMemory(name, track=False)
+        except TypeError:
+            # Python < 3.13: do not let resource tracker of the reader unlink it
+            # (unless the publisher is in the same process)
+            self.shm = shared_memory.SharedMemory(name)
+            if self.shm.name not in _created:
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(_tracker_name(self.shm.name), "shared_memory")
+
+        magic, address, _, slots, slot_size, head = RingLayout.HEADER.unpack_from(self.shm.buf, 0)
+        if magic != RingLayout.MAGIC: raise ValueError("Not a ring buffer.")
+        self.layout = RingLayout(address)
+        self.slots = slots
+        self.lost = 0
+        self.position = head if latest else max(0, head - slots)
+
+    def head(self):
+        return struct.unpack_from("<Q", self.shm.buf, RingLayout.HEAD_OFFSET)[0]
+
+    def read(self, scaled=False, limit=None):
+        # Returns records written since the last read
+        # - scaled -- scale values as DataParser (Decimal), False for raw integers
+        # - limit  -- maximum number of records
+        buf = self.shm.buf
+        layout = self.layout
+        slot_header, body = RingLayout.SLOT_HEADER, layout.body
+        res = []
+        head = self.head()
+        if head - self.position > self.slots:
+            self.lost += head - self.slots - self.position
+            self.position = head - self.slots
+
+        while self.position < head and (limit is None or len(res) < limit):
+            offset = RingLayout.HEADER.size + (self.position % self.slots) * layout.slot_size
+            seq, mono, wall = slot_header.unpack_from(buf, offset)
+            values = body.unpack_from(buf, offset + slot_header.size)
+            if seq != self.position * 2 + 2 or struct.unpack_from("<Q", buf, offset)[0] != seq:
+                # Overwritten by the publisher while reading, skip to the oldest valid record
+                head = self.head()
+                skip = max(head - self.slots + 1, self.position + 1) - self.position
+                self.lost += skip
+                self.position += skip
+                continue
+            if scaled: values = layout.scale(values)
+            res.append(layout.tuple(*values, mono, wall))
+            self.position += 1
+        return res
+
+    def view(self, limit=None):
+        # Zero-copy read of records written since the last read
+        # Returns RingView; the array is a NumPy structured array on the shared
+        # memory (fields: _slot, mono, time and raw integers). It ends at the end of
+        # the ring, call view() again for the rest. The records may be overwritten
+        # by the publisher: check valid(view) after processing them.
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("view() requires NumPy.")
+        if not hasattr(self, "_slots_array"):
+            self._slots_array = numpy.ndarray((self.slots,), self.layout.dtype(),
+                self.shm.buf, RingLayout.HEADER.size)
+
+        head = self.head()
+        if head - self.position >= self.slots:
+            # The oldest slot may be being overwritten
+            skip = head - self.slots + 1 - self.position
+            self.lost += skip
+            self.position += skip
+        first = self.position % self.slots
+        count = min(head - self.position, self.slots - first)
+        if limit is not None: count = min(count, limit)
+        res = RingView(self.position, self._slots_array[first:first + count])
+        self.position += count
+        return res
+
+    def valid(self, view):
+        # True if no record of the view has been overwritten
+        # A slot is reused when head passes position + slots - 1.
+        head = self.head()
+        if len(view.array) and head + 1 - self.slots > view.position:
+            return False
+        return True
+
+    def close(self):
+        # Arrays returned by view() must be released before close()
+        if hasattr(self, "_slots_array"): del self._slots_array
+        self.shm.close()
@@ -0,0 +1,84 @@
+# Project: OMRON 2JCIE-BU01
+# Module:  omron_2jcie_bu01.sequence
+"""
+Sequence number tracking and loss accounting.
+
+Data from the device carries an 8-bit sequence number. SequenceTracker
+follows it per stream (e.g. address, notification or advertising), handles
+wraparound, and counts duplicates and gaps, so that the loss ratio of each
+acquisition path can be measured.
+
+Example::
+
+    sensor = Omron2JCIE_BU01.ble("AA:BB:CC:DD:EE:FF", timestamp=True)
+    sensor.scan(print, scantime=600)
+    for key, st in sensor.tracker.stats().items():
+        print(key, st.received, st.missing, st.loss_ratio)
+
+NOTE: A gap longer than the modulo (256 updates) cannot be detected from the
+sequence number alone.
+"""
+from collections import namedtuple
+
+# Statistics of a stream
+# - received   -- number of data received
+# - unique     -- number of data with new sequence number
+# - duplicates -- number of data with the same sequence number as the last one
+# - reordered  -- number of data older than the last one
+# - gaps       -- number of gaps in sequence numbers
+# - missing    -- number of sequence numbers skipped
+# - loss_ratio -- missing / (unique + missing)
+StreamStats = namedtuple("stream_stats",
+    ["received", "unique", "duplicates", "reordered", "gaps", "missing", "loss_ratio"])
+
+class SequenceTracker(object):
+    # Track sequence numbers per stream
+    # - modulo -- sequence numbers wrap around at this value
+    NEW, DUPLICATE, GAP, REORDERED = "new", "duplicate", "gap", "reordered"
+
+    def __init__(self, modulo=256):
+        self.modulo = modulo
+        self._last = {}     # key -> last sequence number
+        self._counts = {}   # key -> [received, unique, duplicates, reordered, gaps, missing]
+
+    def update(self, key, seq):
+        # Account a sequence number and return the classification
+        counts = self._counts.setdefault(key, [0, 0, 0, 0, 0, 0])
+        counts[0] += 1
+        last = self._last.get(key)
+        if last is None:
+            self._last[key] = seq
+            counts[1] += 1
+            return self.NEW
+
+        diff = (seq - last) % self.modulo
+        if diff == 0:
+            counts[2] += 1
+            return self.DUPLICATE
+        if diff > self.modulo // 2:
+            # Older than the last one
+            counts[3] += 1
+            return self.REORDERED
+
+        self._last[key] = seq
+        counts[1] += 1
+        if diff == 1: return self.NEW
+        counts[4] += 1
+        counts[5] += diff - 1
+        return self.GAP
+
+    def stats(self, key=None):
+        # StreamStats of the stream, or dict of {key: StreamStats} if key is None
+        if key is None: return {k: self.stats(k) for k in self._counts}
+        received, unique, duplicates, reordered, gaps, missing = self._counts.get(key, [0] * 6)
+        total = unique + missing
+        return StreamStats(received, unique, duplicates, reordered, gaps, missing,
+            missing / total if total else 0.0)
+
+    def reset(self, key=None):
+        if key is None:
+            self._last.clear()
+            self._counts.clear()
+        else:
+            self._last.pop(key, None)
+            self._counts.pop(key, None)
@@ -1,32 +1,63 @@
 # Project: OMRON 2JCIE-BU01
 # Module:  omron_2jcie_bu01.serial
 import struct
+import threading
+import time
 from collections import namedtuple
 from serial import Serial
-from . import Omron2JCIE_BU01, DataParser
+from . import Omron2JCIE_BU01, DataParser, AccelerationWaveform
+from .capture import CaptureWriter
+from .sequence import SequenceTracker
+
+class _Flight(object):
+    # Read command in flight, shared by callers reading the same address
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.received = None    # (monotonic, wall-clock) of the response
+        self.error = None
 
 class Omron2JCIE_BU01_Serial(Omron2JCIE_BU01):
     # Operate OMRON 2JCIE-BU01 via serial
+    # Thread-safe: commands and responses are serialized by lock. Concurrent
+    # reads of the same address are coalesced into one command, and the
+    # response is reused for ttl seconds.
     BAUDRATE = 115200
     MAGIC = b"\x52\x42" # Magic Number: b"RB"
+    PIPELINE = 4        # Number of commands in flight for get_many()
 
-    def __init__(self, portname):
+    def __init__(self, portname, timestamp=False, ttl=0):
         # Connect to serial
+        # - timestamp -- add receive time (mono, time) to parsed data
+        # - ttl       -- seconds to reuse a read response, 0 for no cache
+        #                (set_ttl() for each address)
         self.conn = Serial(portname, self.BAUDRATE, timeout=1.0)
-        self.parser = DataParser()
+        self.parser = DataParser(timestamp)
+        self.tracker = SequenceTracker()
+        self.capture = None     # CaptureWriter for raw data
+        self.lock = threading.RLock()   # Lock for the port
+        self.ttl = ttl
+        self._ttls = {}         # address -> ttl
+        self._cache = {}        # address -> (expiration, data body, received)
+        self._flights = {}      # address -> _Flight
+        self._flights_lock = threading.Lock()
+        self._generation = 0    # Incremented by invalidate()
 
-    def command(self, address, data=b""):
+    def command(self, address, data=b"", write=None):
         # Generate command frame
+        # - write -- True for write command, False for read command with parameter
+        #            data (default: write if data is given)
+        if write is None: write = bool(data)
         header = self.MAGIC
-        mode = b"\x02" if data else b"\x01"
+        mode = b"\x02" if write else b"\x01"
         payload = mode + struct.pack("<h", address) +data
         cmd = header + struct.pack("<H", len(payload) + 2) + payload
         crc = self.crc16(cmd)
         return cmd + crc
 
-    def write_command(self, address, data=b""):
+    def write_command(self, address, data=b"", write=None):
         # Write command to 2JCIE-BU01
-        frame = self.command(address, data)
+        frame = self.command(address, data, write)
         self.conn.write(frame)
 
     def read_response(self):
@@ -44,13 +75,100 @@ class Omron2JCIE_BU01_Serial(Omron2JCIE_BU01):
         crc = self.crc16(header + data[:-2])
         if crc != data[-2:]: raise ValueError("Response CRC not match.")
 
+        if self.capture: self.capture.write(CaptureWriter.RESPONSE, address & 0xffff, data[1:-2])
         return data[1:-2]
 
-    def get(self, address, data=b"", name=None):
+    def transact(self, address, data=b"", write=None):
+        # Write command and read the response exclusively
+        with self.lock:
+            self.write_command(address, data, write)
+            return self.read_response()
+
+    def set_ttl(self, address, ttl):
+        # Seconds to reuse the read response of address
+        self._ttls[address] = ttl
+        self.invalidate(address)
+
+    def _read(self, address, cache=True):
+        # Read address with coalescing and cache
+        # - cache -- False to skip the cached response (the response is still shared
+        #            with reads in flight)
+        # Returns tuple(data body, receive time (monotonic, wall-clock),
+        #               True if read from the device by this call)
+        ttl = self._ttls.get(address, self.ttl)
+        with self._flights_lock:
+            cached = self._cache.get(address)
+            if cache and cached and cached[0] > time.monotonic(): return cached[1], cached[2], False
+            flight = self._flights.get(address)
+            leader = flight is None
+            if leader: flight = self._flights[address] = _Flight()
+            generation = self._generation
+
+        if not leader:
+            # Wait for the command in flight
+            flight.done.wait()
+            if flight.error: raise flight.error
+            return flight.result, flight.received, False
+
+        try:
+            flight.result = self.transact(address)
+            flight.received = (time.monotonic(), time.time())
+            with self._flights_lock:
+                # Do not cache a response read before invalidate()
+                if ttl > 0 and generation == self._generation:
+                    self._cache[address] = (flight.received[0] + ttl, flight.result, flight.received)
+            return flight.result, flight.received, True
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock: del self._flights[address]
+            flight.done.set()
+
+    def invalidate(self, address=None):
+        # Discard cached responses (all addresses if address is None)
+        with self._flights_lock:
+            self._generation += 1
+            if address is None: self._cache.clear()
+            else: self._cache.pop(address, None)
+
+    def get(self, address, data=b"", name=None, read=False):
         # Write command, get the response data and parse it
-        self.write_command(address, data)
-        data = self.read_response()
-        return self.parser.parse(data, name)
+        # - read -- send data as parameter of read command (e.g. 0x503E), not cached
+        if data and read:
+            return self._track(address, self.parser.parse(self.transact(address, data, False), name))
+        if data:
+            self.invalidate(address)
+            return self._track(address, self.parser.parse(self.transact(address, data), name))
+        # Cached and shared responses keep the time they were received
+        data, received, fresh = self._read(address)
+        tpl = self.parser.parse(data, name, received)
+        return self._track(address, tpl) if fresh else tpl
+
+    def get_raw(self, address):
+        # Read address and return the data body (address + payload) without parsing
+        # The response cache is not used (AdaptivePoller measures update timing).
+        return self._read(address, cache=False)[0]
+
+    def get_many(self, address, datas, name=None, read=False):
+        # Pipelined get(): keep up to PIPELINE commands in flight
+        # Responses are returned in order of datas
+        datas = list(datas)
+        res = []
+        sent = 0
+        if not read: self.invalidate(address)
+        with self.lock:
+            try:
+                while len(res) < len(datas):
+                    while sent < len(datas) and sent - len(res) < self.PIPELINE:
+                        self.write_command(address, datas[sent], False if read else None)
+                        sent += 1
+                    res.append(self._track(address, self.parser.parse(self.read_response(), name)))
+            except Exception:
+                # Discard responses in flight, so that the next command does not read them
+                self.conn.reset_input_buffer()
+                raise
+        return res
 
     def crc16(self, s):
         # Calculate CRC16
@@ -67,9 +185,54 @@ class Omron2JCIE_BU01_Serial(Omron2JCIE_BU01):
         # 4.4.3 Latest data long (Address: 0x5021)
         return self.get(0x5021)
 
+    def acceleration_memory(self, index=1, earthquake=True):
+        # 4.5.13 Acceleration memory data [Header] (Address: 0x503E)
+        # 4.5.14 Acceleration memory data [Data] (Address: 0x503F)
+        # Download acceleration waveform stored on the device
+        # - index      -- memory index (1: latest)
+        # - earthquake -- True for earthquake data, False for vibration data
+        # Returns acceleration_waveform; x, y and z are contiguous numpy.int16
+        # arrays in unit of 0.1 gal.
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("acceleration_memory() requires NumPy.")
+
+        datatype = 0x00 if earthquake else 0x01
+        header = self.get(0x503E, struct.pack("<BB", datatype, index), read=True)
+        pages = self.get_many(0x503F,
+            [struct.pack("<BBH", datatype, index, page) for page in range(1, header.pages + 1)],
+            read=True)
+
+        # Concatenate samples of all pages, then split into axes
+        buf = bytearray()
+        for page in pages: buf += page[4:]     # Skip address and page number
+        samples = numpy.frombuffer(bytes(buf), dtype="<i2").reshape(-1, 3)
+        x, y, z = numpy.ascontiguousarray(samples.T, dtype=numpy.int16)
+        return AccelerationWaveform(
+            header.type, header.index, header.si, header.pga, header.seismic_intensity, x, y, z)
+
+    def vibration_events(self, interval=1.0, timeout=None):
+        # Watch vibration and yield acceleration waveform for each new event
+        # - interval -- polling interval (seconds)
+        # - timeout  -- stop watching after seconds, None for infinite
+        # Vibration information of latest_data_long() is polled. While it shows
+        # vibration, the download waits for the end of the event; otherwise
+        # vibration_count() is compared to find events stored since the last poll.
+        started = time.monotonic()
+        prev = self.vibration_count()
+        while timeout is None or time.monotonic() - started < timeout:
+            self.sleep(interval)
+            if self.is_vibrating(self.latest_data_long()): continue
+            cur = self.vibration_count()
+            if cur.earthquake != prev.earthquake:
+                yield self.acceleration_memory(1, earthquake=True)
+            elif cur.vibration != prev.vibration:
+                yield self.acceleration_memory(1, earthquake=False)
+            prev = cur
+
     def info(self):
         # 4.5.25 Device information (Address: 0x180a)
         nmd = namedtuple("device_info", ["model", "serial", "fw_rev", "hw_rev", "manufacturer"])
-        self.write_command(0x180a)
-        data = self.read_response()
+        data = self.transact(0x180a)
         return nmd(*[x.decode("utf8") for x in struct.unpack("<10s10s5s5s5s", data[2:])])
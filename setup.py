@@ -17,10 +17,20 @@ setup(
     author              = omron_2jcie_bu01.__author__,
     author_email        = "nobrin@biokids.org",
     url                 = "https://github.com/nobrin/omron-2jcie-bu01",
-    py_modules          = [MODNAME, f"{MODNAME}.ble", f"{MODNAME}.serial"],
+    py_modules          = [MODNAME, f"{MODNAME}.ble", f"{MODNAME}.serial", f"{MODNAME}.aggregate",
+                           f"{MODNAME}.deadband",
+                           f"{MODNAME}.config",
+                           f"{MODNAME}.ringbuffer",
+                           f"{MODNAME}.gateway",
+                           f"{MODNAME}.sequence",
+                           f"{MODNAME}.poller",
+                           f"{MODNAME}.discovery",
+                           f"{MODNAME}.capture",
+                           f"{MODNAME}.pool",
+                           f"{MODNAME}.codec"],
     scripts             = [f"{MODNAME}/__init__.py", f"{MODNAME}/ble.py", f"{MODNAME}/serial.py"],
     install_requires    = ["pyserial"],
-    extras_require      = {"ble": ["bleak"]},
+    extras_require      = {"ble": ["bleak"], "waveform": ["numpy"]},
     license             = "MIT",
     platforms           = "any",
     classifiers         = [
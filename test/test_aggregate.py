@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import random
+import unittest
+from omron_2jcie_bu01 import DataParser
+from omron_2jcie_bu01.aggregate import P2Quantile, WindowAggregator
+
+class AggregateTestCase(unittest.TestCase):
+    def setUp(self):
+        self.parser = DataParser()
+        self.summaries = []
+
+    def record(self, seq, temperature, eco2):
+        nmd = self.parser.get_adv_namedtuple(0x03)
+        values = dict.fromkeys(nmd._fields, 0)
+        values.update(type=3, seq=seq, temperature=temperature, eCO2=eco2)
+        return nmd(**values)
+
+    def test_quantile(self):
+        rnd = random.Random(1)
+        sk = P2Quantile(0.5)
+        for n in range(10000): sk.add(rnd.random())
+        self.assertAlmostEqual(sk.value(), 0.5, delta=0.02)
+
+    def test_tumbling(self):
+        agg = WindowAggregator(self.summaries.append, window=60)
+        for t in range(0, 180):
+            agg.add(self.record(t % 256, t, 400), "dev", t)
+        self.assertEqual([s.start for s in self.summaries], [0, 60])
+        agg.flush()
+        self.assertEqual(len(self.summaries), 3)
+
+        s = self.summaries[1]
+        self.assertEqual(s.count, 60)
+        self.assertEqual(s.stats["temperature"].min, 60)
+        self.assertEqual(s.stats["temperature"].max, 119)
+        self.assertEqual(s.stats["temperature"].mean, 89.5)
+        self.assertEqual(s.stats["eCO2"].quantiles[0.5], 400)
+        self.assertNotIn("seq", s.stats)
+
+    def test_sliding(self):
+        agg = WindowAggregator(self.summaries.append, window=60, slide=20, fields=["temperature"])
+        for t in range(0, 120):
+            agg.add(self.record(0, 1, 400), "dev", t)
+        agg.advance(120)
+        self.assertEqual([s.start for s in self.summaries], [-40, -20, 0, 20, 40, 60])
+        self.assertEqual([s.count for s in self.summaries], [20, 40, 60, 60, 60, 60])
+
+    def test_fractional(self):
+        # Windows of float length are not split by rounding errors
+        agg = WindowAggregator(self.summaries.append, window=1.0, slide=0.1, fields=["temperature"])
+        for n in range(30):
+            agg.add(self.record(0, 1, 400), "dev", 100 + n * 0.1)
+        agg.advance(103)
+        self.assertEqual(len(self.summaries), len(set(s.start for s in self.summaries)))
+        full = [s for s in self.summaries if s.start >= 100 - 1e-9 and s.end <= 103 + 1e-9]
+        self.assertTrue(full)
+        self.assertTrue(all(s.count == 10 for s in full), [s.count for s in full])
+        self.assertAlmostEqual(full[0].end - full[0].start, 1.0)
+        with self.assertRaises(ValueError): WindowAggregator(None, window=1.0, slide=0.3)
+
+    def test_devices(self):
+        agg = WindowAggregator(self.summaries.append, window=10)
+        agg.add(self.record(0, 20, 400), "a", 1)
+        agg.add(self.record(0, 30, 400), "b", 2)
+        agg.flush()
+        self.assertEqual(sorted(s.device for s in self.summaries), ["a", "b"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import os
+import struct
+import tempfile
+import time
+import unittest
+from decimal import Decimal
+from omron_2jcie_bu01.capture import CaptureWriter, Replayer, read_capture
+
+class CaptureTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "test.cap")
+        sensing = struct.pack("<hhhlhhh", 2500, 5000, 100, 1013250, 3000, 10, 400)
+        with CaptureWriter(self.path) as cap:
+            for seq in range(3):
+                cap.write(CaptureWriter.RESPONSE, 0x5012,
+                    struct.pack("<HB", 0x5012, seq) + sensing, 100.0 + seq * 0.1, 1000.0 + seq)
+            cap.write(CaptureWriter.NOTIFY, 0x5012, struct.pack("<B", 5) + sensing, 100.3, 1003.0)
+            # Active scan: ADV_IND + ADV_RSP
+            cap.write(CaptureWriter.ADVERTISEMENT, 0, struct.pack("<BB", 3, 7) + sensing + b"\0", 100.4, 1004.0)
+            rsp = struct.pack("<hhBHHHhhh", 3000, 2800, 0, 0, 0, 0, 1, 2, 980)
+            cap.write(CaptureWriter.ADVERTISEMENT, 0, struct.pack("<BB", 3, 7) + rsp + b"\0" * 8, 100.5, 1005.0)
+            self.assertEqual(cap.count, 6)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_read(self):
+        recs = list(read_capture(self.path))
+        self.assertEqual([r.kind for r in recs], [1, 1, 1, 2, 3, 3])
+        self.assertEqual(recs[3].key, 0x5012)
+
+    def test_replay(self):
+        responses, notifies, scans = [], [], []
+        rp = Replayer(self.path)
+        started = time.monotonic()
+        stats = rp.run(responses.append, lambda s, t: notifies.append((s, t)), scans.append, speed=10)
+        self.assertGreaterEqual(time.monotonic() - started, 0.045)
+        self.assertEqual((stats.records, stats.parsed, stats.skipped), (6, 5, 1))
+
+        self.assertEqual([t.seq for t in responses], [0, 1, 2])
+        self.assertEqual(responses[1].time, 1001.0)
+        self.assertEqual(notifies[0][0], 0x5012)
+        self.assertEqual(notifies[0][1].temperature, Decimal("25"))
+        self.assertEqual(scans[0].thi, Decimal("30"))
+        self.assertEqual(scans[0].time, 1005.0)
+        self.assertEqual(rp.tracker.stats(0x5012).unique, 3)
+
+    def test_replay_fast(self):
+        stats = Replayer(self.path, timestamp=False).run(speed=None)
+        self.assertEqual(stats.parsed, 5)
+
+if __name__ == "__main__":
+    unittest.main()
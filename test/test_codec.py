@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import struct
+import unittest
+from omron_2jcie_bu01 import DataParser
+from omron_2jcie_bu01.codec import BatchEncoder, BatchDecoder, zigzag, unzigzag
+
+FMT = DataParser.generate_struct_format(DataParser.FIELDS[0x5021])
+
+def frame(seq, temp, pressure, flag=0):
+    return struct.pack("<H", 0x5021) + struct.pack(FMT,
+        seq, temp, 4500, 300, pressure, 4000, 50, 600, 7000, 2000,
+        0, 0, 0, 0, flag, *[0] * 8, 0, 0, 0)
+
+class CodecTestCase(unittest.TestCase):
+    def test_zigzag(self):
+        for n in (0, -1, 1, -2, 2, -65536, 2 ** 40):
+            self.assertEqual(unzigzag(zigzag(n)), n)
+        self.assertEqual([zigzag(n) for n in (0, -1, 1, -2)], [0, 1, 2, 3])
+
+    def test_roundtrip(self):
+        parser = DataParser()
+        # Sequence number wraps around, negative temperature, flag changes
+        records = [parser.parse(frame((250 + n) & 0xff, -5 + n * 3, 1013250 - n * 7, n % 2))
+                   for n in range(10)]
+        payload = BatchEncoder(0x5021).encode(records)
+        res = BatchDecoder().feed(payload)
+        self.assertEqual(res, records)
+        self.assertEqual(res[0]._fields, records[0]._fields)
+        self.assertEqual(res[5].seq, 255)
+        self.assertEqual(res[6].seq, 0)
+
+        # Slowly changing values: a few bytes per record
+        self.assertLess(len(payload), len(records) * 32)
+        raw = BatchDecoder(raw=True).feed(payload)
+        self.assertEqual(raw[0].temperature, -5)
+
+    def test_stream(self):
+        parser = DataParser(timestamp=True)
+        records = [parser.parse(frame(n, 2500, 1013250), received=(n, 1700000000.25 + n))
+                   for n in range(20)]
+        enc = BatchEncoder(0x5021)
+        data = enc.encode(records[:8]) + enc.encode(records[8:]) + enc.encode([])
+
+        dec = BatchDecoder()
+        res = []
+        for n in range(0, len(data), 5):
+            res += dec.feed(data[n:n + 5])
+        self.assertEqual(len(res), 20)
+        self.assertEqual([r.time for r in res], [r.time for r in records])
+        self.assertEqual([r.seq for r in res], list(range(20)))
+        self.assertNotIn("mono", res[0]._fields)
+
+    def test_malformed(self):
+        # A broken batch is dropped and the stream continues
+        tpl = DataParser().parse(frame(1, 2500, 1013250))
+        good = BatchEncoder(0x5021).encode([tpl])
+        broken = b"\x04\x21\x50\x00\x05"
+        dec = BatchDecoder()
+        self.assertEqual(dec.feed(broken), [])
+        self.assertEqual(dec.dropped, 1)
+        self.assertEqual(dec.feed(good), [tpl])
+        with self.assertRaises(ValueError): dec.decode(broken[1:])
+
+        # Records decoded before and after a broken batch in the same chunk
+        self.assertEqual(dec.feed(good + broken + good), [tpl, tpl])
+        self.assertEqual(dec.dropped, 2)
+
+    def test_adv(self):
+        data = struct.pack("<BBhhhlhhhx", 0x01, 9, 2500, 5000, 100, 1013250, 3000, 10, 400)
+        tpl = DataParser().parse_adv(data)
+        self.assertEqual(BatchDecoder().feed(BatchEncoder(0x01).encode([tpl])), [tpl])
+        with self.assertRaises(ValueError): BatchEncoder(0x1234)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import asyncio
+import struct
+import time
+import unittest
+from omron_2jcie_bu01 import Omron2JCIE_BU01, DataParser
+from omron_2jcie_bu01.config import DeviceConfig, provision
+
+class DummySensor(Omron2JCIE_BU01):
+    # Keeps settings in memory and counts commands
+    def __init__(self, broken=False, timestamp=False):
+        self.parser = DataParser(timestamp)
+        self.memory = {
+            0x5111: struct.pack("<HBBB", 0x01, 0, 0, 0),
+            0x5115: struct.pack("<HB", 0x0808, 0x01),
+        }
+        self.reads = self.writes = 0
+        self.broken = broken
+
+    def get(self, address, data=b"", name=None):
+        if data:
+            self.writes += 1
+            if not self.broken: self.memory[address] = data
+        else:
+            self.reads += 1
+        return self.parser.parse(struct.pack("<H", address) + self.memory[address], name)
+
+class DummyBLESensor(DummySensor):
+    # Each command runs on the event loop like Omron2JCIE_BU01_BLE
+    def __init__(self, loop):
+        super().__init__()
+        self.loop = loop
+        self.connected = False
+
+    def use_loop(self, loop):
+        if self.connected: raise RuntimeError("Disconnect before changing the event loop.")
+        prev, self.loop = self.loop, loop
+        return prev
+
+    def is_connected(self): return self.connected
+    def disconnect(self): self.connected = False
+
+    def get(self, address, data=b"", name=None):
+        self.connected = True
+        self.loop.run_until_complete(asyncio.sleep(0.05))
+        return super().get(address, data, name)
+
+class ConfigTestCase(unittest.TestCase):
+    def test_commit(self):
+        sensor = DummySensor()
+        conf = DeviceConfig(sensor).load()
+        self.assertEqual(sensor.reads, 2)
+        self.assertEqual(conf.get("mode"), 0x01)
+
+        conf.set(rule=0x06, red=10).set(green=20, mode=0x03).set(interval=0x0808)
+        report = conf.commit()
+        self.assertEqual(report.changed, {"rule": (1, 6), "red": (0, 10), "green": (0, 20), "mode": (1, 3)})
+        self.assertTrue(report.verified)
+        self.assertEqual(sensor.writes, 2)
+        self.assertEqual(sensor.reads, 4)
+        self.assertEqual(sensor.led().rule, 0x06)
+
+    def test_timestamp(self):
+        # Receive time fields are neither written nor verified
+        sensor = DummySensor(timestamp=True)
+        report = DeviceConfig(sensor).set(rule=0x06, mode=0x03).commit()
+        self.assertTrue(report.verified)
+        self.assertEqual(sensor.memory[0x5115], struct.pack("<HB", 0x0808, 0x03))
+
+    def test_no_change(self):
+        sensor = DummySensor()
+        report = DeviceConfig(sensor).load().set(mode=0x01).commit()
+        self.assertEqual(report.changed, {})
+        self.assertIsNone(report.verified)
+        self.assertEqual(sensor.writes, 0)
+
+    def test_verify_failed(self):
+        report = DeviceConfig(DummySensor(broken=True)).set(mode=0x03).commit()
+        self.assertFalse(report.verified)
+
+    def test_provision(self):
+        sensors = {n: DummySensor() for n in range(5)}
+        sensors[2] = None
+        reports = provision(sensors, workers=3, mode=0x03)
+        self.assertEqual(sorted(reports), list(range(5)))
+        self.assertTrue(reports[0].verified)
+        self.assertEqual(reports[1].changed, {"mode": (1, 3)})
+        self.assertIsNotNone(reports[2].error)
+
+    def test_provision_shared_loop(self):
+        # Sensors sharing a loop are configured concurrently
+        loop = asyncio.new_event_loop()
+        sensors = [DummyBLESensor(loop) for n in range(6)]
+        sensors[0].connected = True     # Disconnected on the shared loop first
+        started = time.monotonic()
+        reports = provision(sensors, workers=6, mode=0x03)
+        elapsed = time.monotonic() - started
+        self.assertTrue(all(r.verified for r in reports.values()), reports)
+        self.assertLess(elapsed, 0.15 * 6 / 2)
+        self.assertTrue(all(s.loop is loop and not s.connected for s in sensors))
+        loop.close()
+
+    def test_commit_failed(self):
+        sensor = DummySensor()
+        conf = DeviceConfig(sensor).load()
+        def _get(address, data=b"", name=None):
+            if data and address == 0x5115: raise IOError("write failed")
+            return DummySensor.get(sensor, address, data, name)
+        sensor.get = _get
+        conf.set(red=10, mode=0x03)
+        with self.assertRaises(IOError): conf.commit()
+        self.assertEqual(conf._pending, {0x5115: {"mode": 0x03}})
+        self.assertEqual(conf.get("red"), 10)
+
+        # Retry after recovery
+        del sensor.get
+        self.assertEqual(conf.commit().changed, {"mode": (1, 3)})
+
+    def test_unknown(self):
+        with self.assertRaises(KeyError): DeviceConfig(DummySensor()).set(color=1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import struct
+import unittest
+from decimal import Decimal
+from omron_2jcie_bu01 import Omron2JCIE_BU01, DataParser
+from omron_2jcie_bu01.deadband import DeadbandFilter
+
+class DummySensor(Omron2JCIE_BU01):
+    # Returns 0x5012 data from the list
+    def __init__(self, temperatures):
+        self.parser = DataParser()
+        self.temperatures = list(temperatures)
+
+    def get(self, address, data=b"", name=None):
+        t = self.temperatures.pop(0)
+        frame = struct.pack("<HBhhhlhhh", address, 0, t, 5000, 100, 1000000, 3000, 10, 400)
+        return self.parser.parse(frame, name)
+
+    def sleep(self, seconds): pass
+
+class DeadbandTestCase(unittest.TestCase):
+    def test_absolute(self):
+        db = DeadbandFilter(absolute={"temperature": 0.1})
+        sensor = DummySensor([2500, 2505, 2509, 2510, 2490, 2485])
+        res = [tpl.temperature for tpl in sensor.poll(0x5012, count=6, deadband=db)]
+        self.assertEqual(res, [Decimal("25"), Decimal("25.1"), Decimal("24.9")])
+        self.assertEqual((db.passed, db.suppressed), (3, 3))
+
+    def test_relative(self):
+        db = DeadbandFilter(relative={"temperature": 0.1})
+        sensor = DummySensor([1000, 1090, 1100, 1200, 1215])
+        res = [tpl.temperature for tpl in sensor.poll(0x5012, count=5, deadband=db)]
+        self.assertEqual(res, [Decimal("10"), Decimal("11"), Decimal("12.15")])
+
+    def test_heartbeat(self):
+        db = DeadbandFilter(absolute={"temperature": 1}, heartbeat=10)
+        sensor = DummySensor([2500] * 4)
+        res = [db.check(sensor.get(0x5012), "dev", t) for t in (0, 5, 10, 15)]
+        self.assertEqual(res, [True, False, True, False])
+
+    def test_any_change(self):
+        db = DeadbandFilter()
+        sensor = DummySensor([2500, 2500, 2501])
+        self.assertEqual(len(list(sensor.poll(0x5012, count=3, deadband=db))), 2)
+
+    def test_wrap_notify(self):
+        db = DeadbandFilter(absolute={"temperature": 1})
+        res = []
+        cb = db.wrap_notify(lambda sender, tpl: res.append(sender))
+        sensor = DummySensor([2500, 2500, 2500])
+        cb(1, sensor.get(0x5012))
+        cb(2, sensor.get(0x5012))
+        cb(1, sensor.get(0x5012))
+        self.assertEqual(res, [1, 2])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import asyncio
+import os
+import tempfile
+import time
+import types
+import unittest
+from unittest import mock
+from omron_2jcie_bu01.discovery import DeviceCache, DeviceEntry, discover
+
+class DummyScanner(object):
+    # Devices appear one by one at every poll of discovered_devices
+    DEVICES = [
+        ("AA:BB:CC:DD:EE:01", None, -80),     # Name not received yet
+        ("11:22:33:44:55:66", "Other", -40),
+        ("AA:BB:CC:DD:EE:02", "Rbt", -60),
+        ("AA:BB:CC:DD:EE:03", "Rbt", -50),
+    ]
+
+    def __init__(self, **kw):
+        self.polls = 0
+
+    async def __aenter__(self): return self
+    async def __aexit__(self, *args): pass
+
+    @property
+    def discovered_devices(self):
+        self.polls += 1
+        return [types.SimpleNamespace(address=a, name=n, rssi=r) for a, n, r in self.DEVICES[:self.polls]]
+
+class DeviceCacheTestCase(unittest.TestCase):
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "sub", "devices.json")
+            cache = DeviceCache(path)
+            self.assertEqual(cache.addresses(), [])
+
+            now = time.time()
+            cache.update([
+                DeviceEntry("aa:bb:cc:dd:ee:01", -60, now - 100),
+                DeviceEntry("AA:BB:CC:DD:EE:02", -70, now),
+            ])
+            cache = DeviceCache(path)
+            self.assertEqual(cache.addresses(), ["AA:BB:CC:DD:EE:02", "AA:BB:CC:DD:EE:01"])
+            self.assertEqual(cache.addresses(max_age=10), ["AA:BB:CC:DD:EE:02"])
+            self.assertEqual(cache.devices["AA:BB:CC:DD:EE:01"].rssi, -60)
+
+class DiscoverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        patcher = mock.patch.dict(sys.modules, {"bleak": types.SimpleNamespace(BleakScanner=DummyScanner)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def discover(self, *args, **kw):
+        started = time.monotonic()
+        res = discover(*args, timeout=5, cache=None, loop=self.loop, **kw)
+        self.assertLess(time.monotonic() - started, 1.0)    # Returned before timeout
+        return [e.address for e in res]
+
+    def test_count(self):
+        self.assertEqual(self.discover(1), ["AA:BB:CC:DD:EE:02"])
+        self.assertEqual(self.discover(2), ["AA:BB:CC:DD:EE:03", "AA:BB:CC:DD:EE:02"])
+
+    def test_address(self):
+        self.assertEqual(self.discover(addresses=["aa:bb:cc:dd:ee:01"]), ["AA:BB:CC:DD:EE:01"])
+        self.assertEqual(self.discover(addresses=["AA:BB:CC:DD:EE:03"]), ["AA:BB:CC:DD:EE:03"])
+
+    def test_known(self):
+        # A known device is found before the name is received
+        self.assertEqual(self.discover(1, known=["AA:BB:CC:DD:EE:01"]), ["AA:BB:CC:DD:EE:01"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import json
+import os
+import struct
+import tempfile
+import threading
+import unittest
+from urllib.request import urlopen
+from omron_2jcie_bu01 import Omron2JCIE_BU01, DataParser
+from omron_2jcie_bu01.gateway import Gateway, GatewayClient
+
+class DummySensor(Omron2JCIE_BU01):
+    def __init__(self):
+        self.parser = DataParser()
+        self.seq = 0
+
+    def get(self, address, data=b"", name=None):
+        self.seq += 1
+        frame = struct.pack("<HBhhhlhhh", address, self.seq % 256, 2500, 5000, 100, 1013250, 3000, 10, 400)
+        return self.parser.parse(frame, name)
+
+class GatewayTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "gw.sock")
+        self.gw = Gateway()
+
+    def tearDown(self):
+        self.gw.stop()
+        self.tmpdir.cleanup()
+
+    def test_get_and_subscribe(self):
+        self.gw.serve_unix(self.path)
+        self.gw.start()
+        self.gw.update("dev", 0x5012, DummySensor().get(0x5012))
+
+        client = GatewayClient(self.path)
+        res = client.get("dev", 0x5012)
+        self.assertEqual(res["data"]["temperature"], 25.0)
+        self.assertIsNone(client.get("dev", 0x5013))
+        self.assertEqual(client.list(), ["dev 0x5012"])
+        client.close()
+
+        received = []
+        sub = GatewayClient(self.path)
+        subscribed = threading.Event()
+        def _subscribe():
+            for update in sub.subscribe("dev"):
+                received.append(update["data"]["seq"])
+                if len(received) == 3: break
+        th = threading.Thread(target=_subscribe)
+        th.start()
+        # Wait until the subscription is registered
+        while not self.gw._subscribers: th.join(0.01)
+
+        sensor = DummySensor()
+        for n in range(3):
+            self.gw.update("other", 0x5012, sensor.get(0x5012))
+            self.gw.update("dev", 0x5012, sensor.get(0x5012))
+        th.join(5)
+        self.assertEqual(received, [2, 4, 6])
+        sub.close()
+
+    def test_stop_with_full_queue(self):
+        # A slow subscriber must not block stop()
+        gw = Gateway(queue_size=2)
+        sub = gw.subscribe()
+        sensor = DummySensor()
+        for n in range(5): gw.update("dev", 0x5012, sensor.get(0x5012))
+        th = threading.Thread(target=gw.stop, daemon=True)
+        th.start()
+        th.join(2)
+        self.assertFalse(th.is_alive())
+        self.assertEqual(len(list(sub)), 1)
+        self.assertEqual(sub.dropped, 4)
+
+    def test_stop_not_started(self):
+        # stop() must not wait for servers which have never been started
+        self.gw.serve_unix(self.path)
+        th = threading.Thread(target=self.gw.stop, daemon=True)
+        th.start()
+        th.join(2)
+        self.assertFalse(th.is_alive())
+
+    def test_subscriber_disconnected(self):
+        # The handler of a subscriber ends when the client closes the connection
+        self.gw.check_interval = 0.01
+        self.gw.serve_unix(self.path)
+        self.gw.start()
+        client = GatewayClient(self.path)
+        client.sock.sendall(b"SUBSCRIBE dev\n")
+        while not self.gw._subscribers: threading.Event().wait(0.01)
+        client.close()
+        for n in range(200):
+            if not self.gw._subscribers: break
+            threading.Event().wait(0.01)
+        self.assertEqual(self.gw._subscribers, set())
+
+    def test_poll_and_http(self):
+        server = self.gw.serve_http(0)
+        self.gw.add("dev", DummySensor(), [0x5012], interval=0.01)
+        sub = self.gw.subscribe("dev")
+        self.gw.start()
+        next(iter(sub))
+
+        port = server.server_address[1]
+        res = json.loads(urlopen(f"http://127.0.0.1:{port}/latest/dev/0x5012").read())
+        self.assertEqual(res["sensor"], "dev")
+        res = json.loads(urlopen(f"http://127.0.0.1:{port}/latest").read())
+        self.assertEqual(len(res), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import struct
+import time
+import unittest
+from omron_2jcie_bu01 import Omron2JCIE_BU01, DataParser
+from omron_2jcie_bu01.poller import AdaptivePoller
+from omron_2jcie_bu01.sequence import SequenceTracker
+
+class DummySensor(Omron2JCIE_BU01):
+    # Updates sequence number every period seconds
+    def __init__(self, period):
+        self.parser = DataParser()
+        self.tracker = SequenceTracker()
+        self.period = period
+        self.started = time.monotonic()
+        self.reads = 0
+
+    def get_raw(self, address):
+        self.reads += 1
+        seq = int((time.monotonic() - self.started) / self.period) % 256
+        return struct.pack("<HBhhhlhhh", address, seq, 2500, 5000, 100, 1013250, 3000, 10, 400)
+
+class PollerTestCase(unittest.TestCase):
+    def test_adaptive(self):
+        sensor = DummySensor(0.05)
+        poller = AdaptivePoller(sensor, 0x5012, interval=0.1, min_interval=0.001, resync=5)
+        res = list(poller.iterate(count=10))
+        self.assertEqual(len(res), 10)
+        self.assertAlmostEqual(poller.period, 0.05, delta=0.01)
+
+        # After learning, few duplicates per update
+        polls, duplicates = poller.polls, poller.duplicates
+        res = list(poller.iterate(count=20))
+        self.assertLess(poller.duplicates - duplicates, 20)
+        st = sensor.loss_stats()[0x5012]
+        self.assertEqual(st.duplicates, 0)
+        self.assertLess(st.loss_ratio, 0.1)
+
+    def test_poll(self):
+        sensor = DummySensor(0.02)
+        res = list(sensor.poll(0x5012, interval=0.02, count=5, adaptive=True))
+        self.assertEqual(len(set(tpl.seq for tpl in res)), 5)
+
+if __name__ == "__main__":
+    unittest.main()
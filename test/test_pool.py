@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import struct
+import threading
+import time
+import unittest
+from omron_2jcie_bu01 import DataParser
+from omron_2jcie_bu01.pool import BLEConnectionPool
+from omron_2jcie_bu01.sequence import SequenceTracker
+
+class DummyBLE(object):
+    # Emulates Omron2JCIE_BU01_BLE with a limited adapter
+    adapter = set()
+    log = []
+
+    def __init__(self, address):
+        self.address = address
+        self.parser = DataParser()
+        self.tracker = SequenceTracker()
+        self.seq = 0
+
+    def connect(self):
+        if len(self.adapter) >= 2: raise RuntimeError("No free connection slot")
+        self.adapter.add(self.address)
+
+    def disconnect(self):
+        self.adapter.discard(self.address)
+
+    def get_raw(self, chara):
+        if self.address not in self.adapter: raise RuntimeError("Not connected")
+        self.log.append(self.address)
+        time.sleep(0.001)
+        self.seq += 1
+        return struct.pack("<HBhhhlhhh", chara, self.seq % 256, 2500, 5000, 100, 1013250, 3000, 10, 400)
+
+    def get(self, chara, data=b"", name=None):
+        tpl = self.parser.parse(self.get_raw(chara), name)
+        self.tracker.update(chara, tpl.seq)
+        return tpl
+
+class PoolTestCase(unittest.TestCase):
+    def setUp(self):
+        DummyBLE.adapter = set()
+        DummyBLE.log = []
+        self.pool = BLEConnectionPool(max_connections=2, idle_timeout=None, factory=DummyBLE)
+
+    def test_lru(self):
+        for addr in "ABCDE": self.pool.add(addr)
+        res = self.pool.read_all(0x5012)
+        self.assertEqual(sorted(res), list("ABCDE"))
+        self.assertTrue(all(type(t).__name__ == "latest_sensing_data" for t in res.values()))
+        self.assertEqual(self.pool.connected(), ["D", "E"])
+
+        # Warm connection is reused
+        self.pool.get("D", 0x5012)
+        self.assertEqual(self.pool.connected(), ["E", "D"])
+        self.pool.get("A", 0x5012)
+        self.assertEqual(self.pool.connected(), ["D", "A"])
+        self.assertEqual(self.pool.latency("D").connects, 1)
+        self.assertEqual(self.pool.latency("D").count, 2)
+
+    def test_idle(self):
+        self.pool.idle_timeout = 10
+        self.pool.get("A", 0x5012)
+        self.pool.evict_idle(time.monotonic() + 11)
+        self.assertEqual(self.pool.connected(), [])
+        self.assertEqual(DummyBLE.adapter, set())
+
+    def test_idle_timer(self):
+        # Idle links are disconnected without further requests
+        self.pool.idle_timeout = 0.05
+        self.pool.get("A", 0x5012)
+        self.pool.get("B", 0x5012)
+        deadline = time.monotonic() + 2
+        while self.pool.connected() and time.monotonic() < deadline: time.sleep(0.01)
+        self.assertEqual(self.pool.connected(), [])
+        self.assertEqual(DummyBLE.adapter, set())
+
+    def test_maintenance_waits(self):
+        # evict_idle() and close() wait for the request in progress
+        self.pool.get("A", 0x5012)
+        self.pool._enter("A")
+        th = threading.Thread(target=self.pool.close)
+        th.start()
+        th.join(0.05)
+        self.assertTrue(th.is_alive())
+        self.assertEqual(self.pool.connected(), ["A"])
+        self.pool._leave()
+        th.join(1)
+        self.assertEqual(self.pool.connected(), [])
+
+    def test_proxy(self):
+        sensor = self.pool.sensor("A")
+        self.assertEqual(type(sensor.latest_sensing_data()).__name__, "latest_sensing_data")
+        self.assertEqual(sensor.get_raw(0x5012)[:2], b"\x12\x50")
+        self.assertEqual(sensor.loss_stats()[0x5012].unique, 1)
+        res = list(sensor.poll(0x5012, interval=0.01, count=2, adaptive=True))
+        self.assertEqual(len(res), 2)
+
+    def test_fair(self):
+        # A busy sensor does not starve others
+        self.pool._enter("X")
+        threads = [threading.Thread(target=self.pool.get, args=("A", 0x5012)) for _ in range(4)]
+        threads.append(threading.Thread(target=self.pool.get, args=("B", 0x5012)))
+        for th in threads:
+            th.start()
+            time.sleep(0.01)
+        self.pool._leave()
+        for th in threads: th.join()
+        self.assertEqual(DummyBLE.log, ["A", "B", "A", "A", "A"])
+
+if __name__ == "__main__":
+    unittest.main()
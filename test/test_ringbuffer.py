@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import struct
+import unittest
+from decimal import Decimal
+from omron_2jcie_bu01 import DataParser
+from omron_2jcie_bu01.ringbuffer import RingPublisher, RingReader
+
+try: import numpy
+except ImportError: numpy = None
+
+class RingBufferTestCase(unittest.TestCase):
+    def setUp(self):
+        self.parser = DataParser()
+        self.ring = RingPublisher(address=0x5012, slots=8)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def frame(self, seq):
+        return struct.pack("<HBhhhlhhh", 0x5012, seq, 2500 + seq, 5000, 100, 1013250, 3000, 10, 400)
+
+    def test_read(self):
+        reader = RingReader(self.ring.name)
+        self.ring.publish(self.parser.parse(self.frame(1)), 1.0, 100.0)
+        self.ring.publish_frame(self.frame(2), 2.0, 200.0)
+        res = reader.read()
+        self.assertEqual([r.seq for r in res], [1, 2])
+        self.assertEqual(res[0].temperature, 2501)
+        self.assertEqual((res[1].mono, res[1].time), (2.0, 200.0))
+        self.assertEqual(reader.read(), [])
+
+        self.ring.publish_frame(self.frame(3))
+        rec = reader.read(scaled=True)[0]
+        self.assertEqual(rec.temperature, Decimal("25.03"))
+        self.assertEqual(rec.pressure, Decimal("1013.25"))
+        reader.close()
+
+    def test_timestamp(self):
+        reader = RingReader(self.ring.name)
+        parser = DataParser(timestamp=True)
+        self.ring.publish(parser.parse(self.frame(1), received=(5.0, 500.0)))
+        self.ring.publish(parser.parse(self.frame(2), received=(6.0, 600.0)), 7.0, 700.0)
+        res = reader.read()
+        self.assertEqual([(r.mono, r.time) for r in res], [(5.0, 500.0), (7.0, 700.0)])
+        reader.close()
+
+    def test_overrun(self):
+        reader = RingReader(self.ring.name)
+        for seq in range(20): self.ring.publish_frame(self.frame(seq))
+        res = reader.read()
+        self.assertEqual([r.seq for r in res], list(range(12, 20)))
+        self.assertEqual(reader.lost, 12)
+
+        # Late reader starts from the latest
+        self.assertEqual(RingReader(self.ring.name).read(), [])
+        self.assertEqual(len(RingReader(self.ring.name, latest=False).read()), 8)
+
+    @unittest.skipUnless(numpy, "NumPy is not installed")
+    def test_view(self):
+        reader = RingReader(self.ring.name)
+        for seq in range(6): self.ring.publish_frame(self.frame(seq), float(seq), 100.0 + seq)
+        v = reader.view()
+        self.assertEqual(v.position, 0)
+        self.assertEqual(v.array["seq"].tolist(), list(range(6)))
+        self.assertEqual(v.array["temperature"].tolist(), [2500 + n for n in range(6)])
+        self.assertEqual(v.array["pressure"][0], 1013250)
+        self.assertEqual(v.array["time"][5], 105.0)
+        self.assertTrue(reader.valid(v))
+
+        # The view ends at the end of the ring
+        for seq in range(6, 10): self.ring.publish_frame(self.frame(seq))
+        w = reader.view()
+        self.assertEqual((w.position, len(w.array)), (6, 2))
+        self.assertEqual(reader.view().array["temperature"].tolist(), [2508, 2509])
+
+        # Zero-copy: reused slots show through the old view, which is invalid
+        self.assertEqual(v.array["temperature"][0], 2508)
+        self.assertFalse(reader.valid(v))
+        self.assertTrue(reader.valid(w))
+        self.assertEqual(reader.lost, 0)
+
+        # Overrun: the slot which may be being written is skipped too
+        for seq in range(20): self.ring.publish_frame(self.frame(seq))
+        x = reader.view(limit=4)
+        self.assertEqual((x.position, reader.lost), (23, 13))
+        del v, w, x
+        reader.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import struct
+import unittest
+from omron_2jcie_bu01 import DataParser, AdvertisementAssembler, NotTarget
+from omron_2jcie_bu01.sequence import SequenceTracker
+
+class SequenceTestCase(unittest.TestCase):
+    def test_tracker(self):
+        tr = SequenceTracker()
+        res = [tr.update("a", seq) for seq in (250, 251, 251, 254, 255, 0, 3, 2)]
+        self.assertEqual(res, ["new", "new", "duplicate", "gap", "new", "new", "gap", "reordered"])
+        st = tr.stats("a")
+        self.assertEqual(st.received, 8)
+        self.assertEqual((st.unique, st.duplicates, st.reordered), (6, 1, 1))
+        self.assertEqual((st.gaps, st.missing), (2, 4))
+        self.assertAlmostEqual(st.loss_ratio, 0.4)
+
+        tr.update("b", 0)
+        self.assertEqual(sorted(tr.stats()), ["a", "b"])
+        self.assertEqual(tr.stats("b").loss_ratio, 0.0)
+
+    def test_advertisement(self):
+        # Duplicates excluded by distinct are counted
+        tr = SequenceTracker()
+        asm = AdvertisementAssembler(DataParser(), tr)
+        adv = struct.pack("<BBhhhlhhhx", 0x01, 5, 2500, 5000, 100, 1013250, 3000, 10, 400)
+        res = []
+        for n in range(3):
+            try: res.append(asm.parse(adv))
+            except NotTarget: pass
+        self.assertEqual(len(res), 1)
+        st = tr.stats(("adv", 0x01))
+        self.assertEqual((st.received, st.duplicates), (3, 2))
+
+        # Active scan: ADV_IND is counted, ADV_RSP of the same event is not
+        ind = struct.pack("<BBhhhlhhhx", 0x03, 9, 2500, 5000, 100, 1013250, 3000, 10, 400)
+        rsp = struct.pack("<BBhhBHHHhhh", 0x03, 9, 7000, 2000, 0, 0, 0, 0, 10, 20, 980) + bytes(8)
+        for data in (ind, rsp, ind, rsp):
+            try: asm.parse(data)
+            except NotTarget: pass
+        st = tr.stats(("adv", 0x03))
+        self.assertEqual((st.received, st.duplicates), (2, 1))
+
+    def test_timestamp(self):
+        frame = struct.pack("<HBhhhlhhh", 0x5012, 1, 2500, 5000, 100, 1013250, 3000, 10, 400)
+        tpl = DataParser().parse(frame)
+        self.assertNotIn("time", tpl._fields)
+
+        tpl = DataParser(timestamp=True).parse(frame)
+        self.assertEqual(tpl._fields[-2:], ("mono", "time"))
+        tpl = DataParser(timestamp=True).parse(frame, received=(1.0, 2.0))
+        self.assertEqual((tpl.mono, tpl.time), (1.0, 2.0))
+
+        adv = DataParser(timestamp=True).get_adv_namedtuple(0x03)
+        self.assertEqual(adv._fields[-2:], ("mono", "time"))
+
+if __name__ == "__main__":
+    unittest.main()
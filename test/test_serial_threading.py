@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import struct
+import threading
+import time
+import unittest
+from omron_2jcie_bu01 import DataParser
+from omron_2jcie_bu01.serial import Omron2JCIE_BU01_Serial
+
+class DummyPort(object):
+    # Emulates 2JCIE-BU01 on the serial port
+    def __init__(self, crc16, delay=0.01):
+        self.crc16 = crc16
+        self.delay = delay
+        self.buf = b""
+        self.commands = 0
+        self.seq = 0
+        self.led = struct.pack("<HBBB", 1, 0, 0, 0)
+
+    def write(self, frame):
+        mode, address = struct.unpack("<Bh", frame[4:7])
+        data = frame[7:-2]
+        self.commands += 1
+        time.sleep(self.delay)
+        if address == 0x5021:
+            self.seq += 1
+            fmt = DataParser.generate_struct_format(DataParser.FIELDS[0x5021])
+            payload = struct.pack(fmt, self.seq % 256, *[0] * (len(fmt) - 2))
+        elif address == 0x5111:
+            if data: self.led = data
+            payload = self.led
+        body = struct.pack("<Bh", mode, address) + payload
+        res = b"RB" + struct.pack("<H", len(body) + 2) + body
+        self.buf += res + self.crc16(res)
+
+    def read(self, n):
+        res, self.buf = self.buf[:n], self.buf[n:]
+        return res
+
+class SerialThreadingTestCase(unittest.TestCase):
+    def sensor(self, ttl=0, timestamp=False):
+        sensor = Omron2JCIE_BU01_Serial(None, timestamp, ttl)
+        sensor.conn = DummyPort(sensor.crc16)
+        return sensor
+
+    def run_threads(self, func, n=8):
+        res = []
+        def _run(): res.append(func())
+        threads = [threading.Thread(target=_run) for _ in range(n)]
+        for th in threads: th.start()
+        for th in threads: th.join()
+        return res
+
+    def test_coalescing(self):
+        sensor = self.sensor()
+        res = self.run_threads(sensor.latest_data_long)
+        self.assertEqual(len(res), 8)
+        # Concurrent reads share commands in flight
+        self.assertLess(sensor.conn.commands, 8)
+        self.assertEqual(sensor.loss_stats()[0x5021].duplicates, 0)
+
+    def test_ttl(self):
+        sensor = self.sensor(ttl=10)
+        seqs = [sensor.latest_data_long().seq for _ in range(3)]
+        self.assertEqual(seqs, [1, 1, 1])
+        self.assertEqual(sensor.conn.commands, 1)
+
+        sensor.set_ttl(0x5021, 0)
+        self.assertEqual(sensor.latest_data_long().seq, 2)
+
+    def test_ttl_timestamp(self):
+        # Cached responses keep the receive time
+        sensor = self.sensor(ttl=10, timestamp=True)
+        first = sensor.latest_data_long()
+        time.sleep(0.05)
+        second = sensor.latest_data_long()
+        self.assertEqual(second.seq, first.seq)
+        self.assertEqual((second.mono, second.time), (first.mono, first.time))
+
+    def test_raw_bypasses_cache(self):
+        sensor = self.sensor(ttl=10)
+        sensor.latest_data_long()
+        sensor.get_raw(0x5021)
+        self.assertEqual(sensor.conn.commands, 2)
+        # The cache is refreshed by the response
+        self.assertEqual(sensor.latest_data_long().seq, 2)
+        self.assertEqual(sensor.conn.commands, 2)
+
+    def test_write_invalidates(self):
+        sensor = self.sensor(ttl=10)
+        self.assertEqual(sensor.led().rule, 1)
+        self.assertEqual(sensor.led(rule=6).rule, 6)
+        self.assertEqual(sensor.led().rule, 6)
+
+    def test_mixed(self):
+        # Interleaved reads and writes from threads do not mix up responses
+        sensor = self.sensor()
+        sensor.conn.delay = 0
+        def _run():
+            for n in range(20):
+                self.assertEqual(type(sensor.latest_data_long()).__name__, "latest_data_long")
+                self.assertEqual(type(sensor.led()).__name__, "led_setting")
+            return True
+        self.assertEqual(self.run_threads(_run), [True] * 8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+import sys
+sys.path.insert(0, "../lib-ext")
+sys.path.insert(0, "..")
+
+import struct
+import unittest
+from decimal import Decimal
+from omron_2jcie_bu01 import DataParser
+from omron_2jcie_bu01.serial import Omron2JCIE_BU01_Serial
+
+try: import numpy
+except ImportError: numpy = None
+
+class DummyPort(object):
+    # Emulates acceleration memory of 2 pages, 3 samples each
+    SAMPLES = [(n, -n, 980 + n) for n in range(6)]
+
+    def __init__(self, crc16):
+        self.crc16 = crc16
+        self.buf = b""
+        self.modes = []         # (mode, address) of commands
+        self.counts = [(0, 0), (0, 0), (0, 1), (0, 1)]
+        self.vibrations = [1, 0, 0]
+
+    def write(self, frame):
+        mode, address = struct.unpack("<BH", frame[4:7])
+        data = frame[7:-2]
+        self.modes.append((mode, address))
+        if address == 0x5031:
+            payload = struct.pack("<LL", *self.counts.pop(0))
+        elif address == 0x5021:
+            fmt = DataParser.generate_struct_format(DataParser.FIELDS[0x5021])
+            values = [0] * (len(fmt) - 1)
+            values[10] = self.vibrations.pop(0)
+            payload = struct.pack(fmt, *values)
+        elif address == 0x503E:
+            datatype, index = struct.unpack("<BB", data)
+            payload = struct.pack("<BBHHHHhhh", datatype, index, 2, 12, 345, 1500, 10, 20, 990)
+        elif address == 0x503F:
+            datatype, index, page = struct.unpack("<BBH", data)
+            samples = self.SAMPLES[(page - 1) * 3:page * 3]
+            payload = struct.pack("<H", page) + b"".join(struct.pack("<hhh", *s) for s in samples)
+        body = struct.pack("<BH", mode, address) + payload
+        res = b"RB" + struct.pack("<H", len(body) + 2) + body
+        self.buf += res + self.crc16(res)
+
+    def read(self, n):
+        res, self.buf = self.buf[:n], self.buf[n:]
+        return res
+
+    def reset_input_buffer(self):
+        self.buf = b""
+
+class DummySensor(Omron2JCIE_BU01_Serial):
+    def __init__(self):
+        super().__init__(None)
+        self.conn = DummyPort(self.crc16)
+
+    def sleep(self, seconds): pass
+
+@unittest.skipUnless(numpy, "NumPy is not installed")
+class WaveformTestCase(unittest.TestCase):
+    def test_acceleration_memory(self):
+        sensor = DummySensor()
+        wf = sensor.acceleration_memory(1)
+        self.assertEqual(wf.type, 0)
+        self.assertEqual(wf.pga, Decimal("34.5"))
+        self.assertEqual(wf.x.dtype, numpy.int16)
+        self.assertTrue(wf.x.flags["C_CONTIGUOUS"])
+        self.assertEqual(wf.x.tolist(), [0, 1, 2, 3, 4, 5])
+        self.assertEqual(wf.y.tolist(), [0, -1, -2, -3, -4, -5])
+        self.assertEqual(wf.z.tolist(), [980, 981, 982, 983, 984, 985])
+
+        # Requests with parameter are read commands
+        self.assertEqual(sensor.conn.modes, [(0x01, 0x503E), (0x01, 0x503F), (0x01, 0x503F)])
+        self.assertEqual(sensor.command(0x503E, b"\x00\x01", write=False)[:-2].hex(), "52420700013e500001")
+
+    def test_pipeline_error(self):
+        # Responses in flight are discarded when a response is broken
+        sensor = DummySensor()
+        crc16 = sensor.conn.crc16
+        sensor.conn.crc16 = lambda s: b"\0\0" if s[5:7] == b"\x3f\x50" and s[7:9] == b"\x01\x00" else crc16(s)
+        with self.assertRaises(ValueError): sensor.acceleration_memory(1)
+        self.assertEqual(sensor.conn.buf, b"")
+        sensor.conn.crc16 = crc16
+        self.assertEqual(sensor.vibration_count().vibration, 0)
+
+    def test_vibration_events(self):
+        # Waits during vibration, vibration count changes at the 2nd poll
+        sensor = DummySensor()
+        wf = next(sensor.vibration_events())
+        self.assertEqual(wf.type, 1)
+        self.assertEqual([a for m, a in sensor.conn.modes[:4]], [0x5031, 0x5021, 0x5021, 0x5031])
+
+if __name__ == "__main__":
+    unittest.main()